@@ -166,10 +166,15 @@ class ZenAddon:
             "scrapy_zen.dupefilters.ZenDupeFilter",
             "addon",
         )
+        # enabled by ZEN_DUPEFILTER_REDIS, last to see the requests before the scheduler
+        settings["SPIDER_MIDDLEWARES"].update(
+            {"scrapy_zen.middlewares.PrefetchDupeFilterMiddleware": 10}
+        )
 
         # extensions
         settings["EXTENSIONS"].update(
             {
+                "scrapy_zen.databases.RedisRegistry": 550,
                 "scrapy_zen.extensions.ZenAutoThrottle": 551,
                 "scrapy_zen.extensions.ZenExtension": 552,
                 "scrapy.extensions.logstats.LogStats": None, # disable default logstats (ZenExtension will handle it)
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Self, Tuple
+from urllib.parse import urlsplit
+from weakref import WeakKeyDictionary
+
+import scrapy
+from scrapy import signals
+from scrapy.crawler import Crawler
+from scrapy.http.request import NO_CALLBACK
+from scrapy.statscollectors import StatsCollector
+from scrapy.utils.defer import maybe_deferred_to_future
+
+from scrapy_zen.delivery import LATENCY_BUCKETS_MS, observe
+
+
+logger = logging.getLogger(__name__)
+
+
+class SinkHTTPError(Exception):
+    """
+    Raised when a sink endpoint answers with a non-2xx status.
+    """
+
+    def __init__(self, message: str, status: int | None = None) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class SinkResponse:
+    """
+    Transport-independent response returned by sink clients.
+    """
+
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def json(self) -> object:
+        return json.loads(self.body)
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise SinkHTTPError(f"HTTP {self.status}: {self.body[:200]!r}", self.status)
+
+
+class EngineClient:
+    """
+    Sends sink requests through the crawl's downloader (`crawler.engine.download`).
+    """
+
+    def __init__(self, crawler: Crawler) -> None:
+        self.crawler = crawler
+
+    async def post(self, url: str, body: bytes | str, headers: Dict) -> SinkResponse:
+        response = await maybe_deferred_to_future(
+            self.crawler.engine.download(
+                scrapy.Request(
+                    url=url,
+                    method="POST",
+                    body=body,
+                    headers=headers,
+                    callback=NO_CALLBACK,
+                )
+            )
+        )
+        return SinkResponse(
+            response.status,
+            {
+                k.decode().lower(): response.headers.get(k).decode()
+                for k in response.headers
+            },
+            response.body,
+        )
+
+    async def close(self) -> None:
+        pass
+
+
+class PooledClient:
+    """
+    Sink HTTP client independent of the crawl's downloader: one keep-alive pool per
+    sink host, HTTP/2 when `h2` is installed, and its own concurrency limit and timeouts.
+
+    Attributes:
+        max_connections (int): max open connections per sink host
+        concurrency (int): max in-flight requests per sink host
+        timeout (float): read/write/pool timeout in seconds
+        connect_timeout (float): connect timeout in seconds
+        http2 (bool): negotiate HTTP/2 when the server supports it
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        concurrency: int = 16,
+        timeout: float = 30.0,
+        connect_timeout: float = 10.0,
+        http2: bool = True,
+        stats: StatsCollector | None = None,
+    ) -> None:
+        import httpx
+
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                http2 = False
+        self.httpx = httpx
+        self.max_connections = max_connections
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.http2 = http2
+        self.stats = stats
+        self.clients: Dict[str, Tuple[object, asyncio.Semaphore]] = {}
+
+    def _client(self, url: str) -> Tuple[object, asyncio.Semaphore]:
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        if host not in self.clients:
+            client = self.httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=self.httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            )
+            self.clients[host] = (client, asyncio.Semaphore(self.concurrency))
+        return self.clients[host]
+
+    async def post(self, url: str, body: bytes | str, headers: Dict) -> SinkResponse:
+        client, sem = self._client(url)
+        async with sem:
+            start = time.monotonic()
+            try:
+                response = await client.post(url, content=body, headers=headers)
+            except Exception:
+                if self.stats:
+                    self.stats.inc_value("zen/sinks/http/errors")
+                raise
+        if self.stats:
+            self.stats.inc_value("zen/sinks/http/requests")
+            self.stats.inc_value(f"zen/sinks/http/status/{response.status_code}")
+            observe(
+                self.stats,
+                "zen/sinks/http/latency_ms",
+                (time.monotonic() - start) * 1000,
+                LATENCY_BUCKETS_MS,
+            )
+        return SinkResponse(
+            response.status_code, dict(response.headers), response.content
+        )
+
+    async def close(self) -> None:
+        clients, self.clients = self.clients, {}
+        await asyncio.gather(*(client.aclose() for client, _ in clients.values()))
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> Self:
+        settings = crawler.settings
+        return cls(
+            max_connections=settings.getint("ZEN_SINK_HTTP_MAX_CONNECTIONS", 20),
+            concurrency=settings.getint("ZEN_SINK_HTTP_CONCURRENCY", 16),
+            timeout=settings.getfloat("ZEN_SINK_HTTP_TIMEOUT", 30.0),
+            connect_timeout=settings.getfloat("ZEN_SINK_HTTP_CONNECT_TIMEOUT", 10.0),
+            http2=settings.getbool("ZEN_SINK_HTTP2", True),
+            stats=crawler.stats,
+        )
+
+
+_clients: "WeakKeyDictionary[Crawler, PooledClient | EngineClient]" = WeakKeyDictionary()
+
+
+def sink_client(crawler: Crawler) -> PooledClient | EngineClient:
+    """
+    Return the HTTP client shared by all sinks of the crawler. `ZEN_SINK_HTTP_CLIENT`
+    picks "pooled" (default, needs httpx) or "engine" (the crawl's downloader).
+    """
+    if crawler in _clients:
+        return _clients[crawler]
+    kind = crawler.settings.get("ZEN_SINK_HTTP_CLIENT", "pooled")
+    client = None
+    if kind == "pooled":
+        try:
+            client = PooledClient.from_crawler(crawler)
+        except ImportError:
+            logger.warning(
+                "httpx is not installed (pip install scrapy-zen[http]), "
+                "sinks fall back to the crawl's downloader"
+            )
+    elif kind != "engine":
+        raise ValueError(f"Unknown ZEN_SINK_HTTP_CLIENT: {kind}")
+    if client is None:
+        client = EngineClient(crawler)
+
+    # engine_stopped fires after spider_closed, so batched sinks can still flush
+    crawler.signals.connect(client.close, signal=signals.engine_stopped)
+    _clients[crawler] = client
+    return client
@@ -1,8 +1,20 @@
 from abc import ABC, abstractmethod
+import asyncio
+from collections import OrderedDict
+import hashlib
+import math
+from pathlib import Path
+import random
+import sqlite3
 import time
-from typing import List
+from weakref import WeakKeyDictionary
+from typing import Any, Callable, Dict, List, Self, Tuple
 import redis.asyncio as redis
-
+from scrapy import signals
+from scrapy.crawler import Crawler
+from scrapy.settings import BaseSettings
+from scrapy.statscollectors import StatsCollector
+from twisted.internet import task
 
 
 class DB(ABC):
@@ -19,6 +31,14 @@ class DB(ABC):
     async def exists(self, id: str, spider_name: str) -> bool:
         ...
 
+    @abstractmethod
+    async def claim(self, id: str, spider_name: str) -> bool:
+        """
+        Atomically insert the id unless it is already present.
+        Returns True if the id was claimed by this call, False if it already existed.
+        """
+        ...
+
     @abstractmethod
     async def remove(self, id: str, spider_name: str) -> None:
         ...
@@ -31,40 +51,1232 @@ class DB(ABC):
     async def close(self) -> None:
         ...
 
+    async def insert_many(self, ids: List[str], spider_name: str) -> None:
+        for id in ids:
+            await self.insert(id, spider_name)
+
+    async def exists_many(self, ids: List[str], spider_name: str) -> List[bool]:
+        return [await self.exists(id, spider_name) for id in ids]
+
+    async def claim_many(self, ids: List[str], spider_name: str) -> List[bool]:
+        return [await self.claim(id, spider_name) for id in ids]
+
+
+def _blake2b(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _xxh128(data: bytes) -> bytes:
+    import xxhash
+
+    return xxhash.xxh3_128_digest(data)
+
+
+# 16-byte digests: the chance of any collision among n ids is about n^2 / 2^129
+DIGESTS: Dict[str, Callable[[bytes], bytes]] = {
+    "blake2b": _blake2b,
+    "xxh128": _xxh128,
+}
+
+
+class TimedConnectionPool(redis.BlockingConnectionPool):
+    """
+    Blocking pool that keeps track of the time spent waiting for a free connection.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def get_connection(self, *args: Any, **kwargs: Any):
+        start = time.monotonic()
+        try:
+            return await super().get_connection(*args, **kwargs)
+        finally:
+            wait = time.monotonic() - start
+            self.wait_count += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+
+class RedisRegistry:
+    """
+    Crawler-scoped owner of the single Redis connection pool borrowed by every zen component.
+    Installed as an extension by ZenAddon, the pool is closed once on engine_stopped, after
+    every component is done with it in spider_closed. Clients that can't share the asyncio
+    pool (the dupefilter is synchronous) build theirs from `connection_kwargs`.
+
+    Attributes:
+        max_connections (int): pool size, callers wait for a free connection beyond it
+        timeout (float): max seconds to wait for a free connection
+        health_check_interval (int): seconds after which an idle connection is checked before use
+        socket_keepalive (bool): enable TCP keepalive on pool connections
+    """
+
+    def __init__(
+        self,
+        stats: StatsCollector,
+        max_connections: int = 50,
+        timeout: float = 20.0,
+        health_check_interval: int = 30,
+        socket_keepalive: bool = True,
+    ) -> None:
+        self.stats = stats
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.socket_keepalive = socket_keepalive
+        self.client: redis.Redis | None = None
+        self.pool: TimedConnectionPool | None = None
+        self._lock: asyncio.Lock | None = None
+        self.task: task.LoopingCall | None = None
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> Self:
+        if crawler in _registries:
+            return _registries[crawler]
+        registry = cls.from_settings(crawler.settings, crawler.stats)
+        crawler.signals.connect(registry.engine_stopped, signal=signals.engine_stopped)
+        _registries[crawler] = registry
+        return registry
+
+    @classmethod
+    def from_settings(
+        cls, settings: BaseSettings, stats: StatsCollector | None = None
+    ) -> Self:
+        return cls(
+            stats=stats,
+            max_connections=settings.getint("DB_MAX_CONNECTIONS", 50),
+            timeout=settings.getfloat("DB_POOL_TIMEOUT", 20.0),
+            health_check_interval=settings.getint("DB_HEALTH_CHECK_INTERVAL", 30),
+            socket_keepalive=settings.getbool("DB_SOCKET_KEEPALIVE", True),
+        )
+
+    def connection_kwargs(self) -> Dict:
+        return dict(
+            max_connections=self.max_connections,
+            timeout=self.timeout,
+            health_check_interval=self.health_check_interval,
+            socket_keepalive=self.socket_keepalive,
+            socket_timeout=5,
+            socket_connect_timeout=5,
+        )
+
+    async def get_client(self, host: str, port: int, password: str | None) -> redis.Redis:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.client is None:
+                self.pool = TimedConnectionPool(
+                    host=host,
+                    port=port,
+                    password=password,
+                    **self.connection_kwargs(),
+                    # members may be binary digests, nothing we read back needs decoding
+                    decode_responses=False,
+                )
+                client = redis.Redis.from_pool(self.pool)
+                try:
+                    await client.ping()
+                except Exception:
+                    await client.aclose()
+                    self.pool = None
+                    raise
+                self.client = client
+                self.task = task.LoopingCall(self.log_stats)
+                self.task.start(10.0)
+        return self.client
+
+    def log_stats(self) -> None:
+        if not self.pool:
+            return
+        in_use = len(self.pool._in_use_connections)
+        idle = len(self.pool._available_connections)
+        self.stats.max_value("zen/redis/pool/max_in_use", in_use)
+        self.stats.set_value("zen/redis/pool/in_use", in_use)
+        self.stats.set_value("zen/redis/pool/idle", idle)
+        self.stats.max_value("zen/redis/pool/max_wait_ms", int(self.pool.max_wait * 1000))
+        if self.pool.wait_count:
+            self.stats.set_value(
+                "zen/redis/pool/avg_wait_ms",
+                f"{self.pool.total_wait * 1000 / self.pool.wait_count:.2f}",
+            )
+
+    async def engine_stopped(self) -> None:
+        if self.task and self.task.running:
+            self.task.stop()
+        if self.client is not None:
+            self.log_stats()
+            await self.client.aclose()
+            self.client = None
+            self.pool = None
+
+
+_registries: WeakKeyDictionary[Crawler, RedisRegistry] = WeakKeyDictionary()
+
 
 class RedisDB(DB):
+    """
+    Stores ids as members of a single sorted set scored by insertion time.
+
+    Attributes:
+        digest (str): store a 16-byte digest of the id instead of the id itself (see DIGESTS)
+        debug_sample (float): fraction of digested ids whose plain text is kept in DEBUG_HASH
+        cleanup_chunk_size (int): max members removed per cleanup round trip
+        cleanup_pause (float): seconds to wait between two cleanup chunks
+        cleanup_interval (int): seconds during which other processes skip cleanup once it ran
+        stats (StatsCollector): receives cleanup progress
+        registry (RedisRegistry): shared pool to borrow the client from, a private one is used if unset
+    """
+
     settings: List[str] = ["DB_HOST", "DB_PORT", "DB_PASS"]
     PROCESSED_IDS_ZSET: str = "processed:ids:zset"
+    DEBUG_HASH: str = "processed:ids:debug"
+    DEBUG_HASH_TTL: int = 7 * 24 * 60 * 60
+    CLEANUP_LOCK: str = "processed:ids:cleanup:lock"
+    # KEYS: the sorted set
+    # ARGV: max score to remove, max members to remove
+    # reads and removes in one step, so a member re-added in between is never dropped
+    CLEANUP_SCRIPT: str = """
+        local members = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+        local removed = 0
+        for i = 1, #members, 1000 do
+            local j = math.min(i + 999, #members)
+            removed = removed + redis.call('ZREM', KEYS[1], unpack(members, i, j))
+        end
+        return removed
+    """
+
+    def __init__(
+        self,
+        digest: str | None = None,
+        debug_sample: float = 0.0,
+        cleanup_chunk_size: int = 1000,
+        cleanup_pause: float = 0.05,
+        cleanup_interval: int = 60 * 60,
+        stats: StatsCollector | None = None,
+        registry: RedisRegistry | None = None,
+    ) -> None:
+        if digest and digest not in DIGESTS:
+            raise ValueError(f"Unknown digest {digest!r}, expected one of {list(DIGESTS)}")
+        self.digest = DIGESTS[digest] if digest else None
+        if self.digest:
+            self.digest(b"")  # fail early if the hashing library is missing
+        self.debug_sample = debug_sample
+        self.cleanup_chunk_size = cleanup_chunk_size
+        self.cleanup_pause = cleanup_pause
+        self.cleanup_interval = cleanup_interval
+        self.stats = stats
+        self.registry = registry
 
     async def connect(self, host: str = "localhost", port: int = 6379, password: str = None) -> None:
-        self.r = redis.Redis(
-            host=host,
-            port=port,
-            password=password,
-            socket_timeout=5,
-            socket_connect_timeout=5,
-            decode_responses=True,
-        )
-        await self.r.ping()
+        if self.registry:
+            self.r = await self.registry.get_client(host, port, password)
+        else:
+            self.r = redis.Redis(
+                host=host,
+                port=port,
+                password=password,
+                socket_timeout=5,
+                socket_connect_timeout=5,
+                # members may be binary digests, nothing we read back needs decoding
+                decode_responses=False,
+            )
+            await self.r.ping()
+        self._cleanup_script = self.r.register_script(self.CLEANUP_SCRIPT)
+
+    def _plain(self, id: str, spider_name: str) -> str:
+        return f"{spider_name}_{id}"
+
+    def _member(self, id: str, spider_name: str) -> str | bytes:
+        if self.digest:
+            return self.digest(f"{spider_name}_{id}".encode())
+        return self._plain(id, spider_name)
+
+    async def _sample(self, ids: List[str], spider_name: str) -> None:
+        """
+        Keep the plain text of a sample of digested ids, for troubleshooting.
+        """
+        if not (self.digest and self.debug_sample):
+            return
+        mapping = {
+            self._member(id, spider_name).hex(): f"{spider_name}_{id}"
+            for id in ids
+            if random.random() < self.debug_sample
+        }
+        if mapping:
+            async with self.r.pipeline(transaction=False) as pipe:
+                pipe.hset(self.DEBUG_HASH, mapping=mapping)
+                pipe.expire(self.DEBUG_HASH, self.DEBUG_HASH_TTL)
+                await pipe.execute()
 
     async def insert(self, id: str, spider_name: str) -> None:
-        unique_id = f"{spider_name}_{id}"
         timestamp = int(time.time())
-        await self.r.zadd(self.PROCESSED_IDS_ZSET, {unique_id: timestamp})
+        await self.r.zadd(self.PROCESSED_IDS_ZSET, {self._member(id, spider_name): timestamp})
+        await self._sample([id], spider_name)
 
     async def exists(self, id: str, spider_name: str) -> bool:
-        unique_id = f"{spider_name}_{id}"
-        score = await self.r.zscore(self.PROCESSED_IDS_ZSET, unique_id)
+        score = await self.r.zscore(self.PROCESSED_IDS_ZSET, self._member(id, spider_name))
         return score is not None
 
+    async def claim(self, id: str, spider_name: str) -> bool:
+        timestamp = int(time.time())
+        added = await self.r.zadd(
+            self.PROCESSED_IDS_ZSET, {self._member(id, spider_name): timestamp}, nx=True
+        )
+        if added:
+            await self._sample([id], spider_name)
+        return added == 1
+
+    async def insert_many(self, ids: List[str], spider_name: str) -> None:
+        timestamp = int(time.time())
+        await self.r.zadd(
+            self.PROCESSED_IDS_ZSET, {self._member(id, spider_name): timestamp for id in ids}
+        )
+        await self._sample(ids, spider_name)
+
+    async def exists_many(self, ids: List[str], spider_name: str) -> List[bool]:
+        scores = await self.r.zmscore(
+            self.PROCESSED_IDS_ZSET, [self._member(id, spider_name) for id in ids]
+        )
+        return [score is not None for score in scores]
+
+    async def claim_many(self, ids: List[str], spider_name: str) -> List[bool]:
+        members = [self._member(id, spider_name) for id in ids]
+        timestamp = int(time.time())
+        async with self.r.pipeline(transaction=True) as pipe:
+            pipe.zmscore(self.PROCESSED_IDS_ZSET, members)
+            pipe.zadd(self.PROCESSED_IDS_ZSET, {x: timestamp for x in members}, nx=True)
+            scores, _ = await pipe.execute()
+        # the same id may appear more than once in a batch, only the first one wins
+        claimed, seen = [], set()
+        for member, score in zip(members, scores):
+            claimed.append(score is None and member not in seen)
+            seen.add(member)
+        await self._sample([id for id, c in zip(ids, claimed) if c], spider_name)
+        return claimed
+
     async def remove(self, id: str, spider_name: str) -> None:
-        unique_id = f"{spider_name}_{id}"
-        self.r.delete(unique_id)
+        await self.r.zrem(self.PROCESSED_IDS_ZSET, self._member(id, spider_name))
 
     async def cleanup(self, days: int) -> None:
+        """
+        Remove expired members in small paced chunks so Redis is never blocked
+        for long. The lock is left to expire on its own: other processes starting
+        within `cleanup_interval` skip the cleanup altogether.
+        """
+        acquired = await self.r.set(
+            self.CLEANUP_LOCK, int(time.time()), nx=True, ex=self.cleanup_interval
+        )
+        if not acquired:
+            if self.stats:
+                self.stats.set_value("zen/db/cleanup/skipped", True)
+            return
         threshold_timestamp = int(time.time()) - (days * 24 * 60 * 60)
-        await self.r.zremrangebyscore(self.PROCESSED_IDS_ZSET, 0, threshold_timestamp)
+        while True:
+            removed = await self._cleanup_script(
+                keys=[self.PROCESSED_IDS_ZSET],
+                args=[threshold_timestamp, self.cleanup_chunk_size],
+            )
+            if not removed:
+                break
+            if self.stats:
+                self.stats.inc_value("zen/db/cleanup/chunks")
+                self.stats.inc_value("zen/db/cleanup/removed", removed)
+            if removed < self.cleanup_chunk_size:
+                break
+            await asyncio.sleep(self.cleanup_pause)
+        if self.stats:
+            self.stats.set_value("zen/db/cleanup/finished", True)
 
     async def close(self) -> None:
-        if hasattr(self, "r"):
+        # a borrowed client is closed by its registry
+        if hasattr(self, "r") and not self.registry:
             await self.r.aclose()
+
+
+class BucketedRedisDB(RedisDB):
+    """
+    Stores ids in one Redis set per spider and per day, every bucket carries
+    its own EXPIREAT so old ids disappear without any cleanup pass.
+    Lookups only touch the buckets of the expiry window of that spider.
+    """
+
+    BUCKET_PREFIX: str = "processed:ids"
+    # KEYS: today's bucket first, then the older buckets of the window
+    # ARGV: expire-at of today's bucket (0 = never), then the members to claim
+    CLAIM_SCRIPT: str = """
+        local claimed = {}
+        for j = 2, #ARGV do
+            local found = 0
+            for i = 1, #KEYS do
+                if redis.call('SISMEMBER', KEYS[i], ARGV[j]) == 1 then
+                    found = 1
+                    break
+                end
+            end
+            if found == 0 then
+                redis.call('SADD', KEYS[1], ARGV[j])
+            end
+            claimed[j - 1] = 1 - found
+        end
+        if ARGV[1] ~= '0' then
+            redis.call('EXPIREAT', KEYS[1], ARGV[1])
+        end
+        return claimed
+    """
+
+    def __init__(
+        self,
+        days: int = 15,
+        digest: str | None = None,
+        debug_sample: float = 0.0,
+        registry: RedisRegistry | None = None,
+    ) -> None:
+        super().__init__(digest=digest, debug_sample=debug_sample, registry=registry)
+        self.days = days
+
+    def _plain(self, id: str, spider_name: str) -> str:
+        # the spider is already part of the key
+        return id
+
+    async def connect(self, host: str = "localhost", port: int = 6379, password: str = None) -> None:
+        await super().connect(host, port, password)
+        self._claim_script = self.r.register_script(self.CLAIM_SCRIPT)
+
+    def bucket(self, spider_name: str, timestamp: float) -> str:
+        # the hash tag keeps every bucket of a spider on the same cluster slot
+        if not self.days:
+            return f"{self.BUCKET_PREFIX}:{{{spider_name}}}:all"
+        day = time.strftime("%Y%m%d", time.gmtime(timestamp))
+        return f"{self.BUCKET_PREFIX}:{{{spider_name}}}:{day}"
+
+    def buckets(self, spider_name: str) -> List[str]:
+        now = time.time()
+        if not self.days:
+            return [self.bucket(spider_name, now)]
+        return [self.bucket(spider_name, now - d * 24 * 60 * 60) for d in range(self.days + 1)]
+
+    def expire_at(self, timestamp: float) -> int:
+        if not self.days:
+            return 0
+        day_start = int(timestamp) - int(timestamp) % (24 * 60 * 60)
+        return day_start + (self.days + 1) * 24 * 60 * 60
+
+    async def insert(self, id: str, spider_name: str) -> None:
+        await self.insert_many([id], spider_name)
+
+    async def exists(self, id: str, spider_name: str) -> bool:
+        return (await self.exists_many([id], spider_name))[0]
+
+    async def claim(self, id: str, spider_name: str) -> bool:
+        return (await self.claim_many([id], spider_name))[0]
+
+    async def remove(self, id: str, spider_name: str) -> None:
+        async with self.r.pipeline(transaction=False) as pipe:
+            for key in self.buckets(spider_name):
+                pipe.srem(key, self._member(id, spider_name))
+            await pipe.execute()
+
+    async def cleanup(self, days: int) -> None:
+        # buckets expire on their own
+        pass
+
+    async def insert_many(self, ids: List[str], spider_name: str) -> None:
+        now = time.time()
+        key = self.bucket(spider_name, now)
+        async with self.r.pipeline(transaction=False) as pipe:
+            pipe.sadd(key, *[self._member(id, spider_name) for id in ids])
+            if self.days:
+                pipe.expireat(key, self.expire_at(now))
+            await pipe.execute()
+        await self._sample(ids, spider_name)
+
+    async def exists_many(self, ids: List[str], spider_name: str) -> List[bool]:
+        async with self.r.pipeline(transaction=False) as pipe:
+            members = [self._member(id, spider_name) for id in ids]
+            for key in self.buckets(spider_name):
+                pipe.smismember(key, members)
+            results = await pipe.execute()
+        return [any(found) for found in zip(*results)]
+
+    async def claim_many(self, ids: List[str], spider_name: str) -> List[bool]:
+        now = time.time()
+        claimed = await self._claim_script(
+            keys=self.buckets(spider_name),
+            args=[self.expire_at(now), *[self._member(id, spider_name) for id in ids]],
+        )
+        claimed = [bool(x) for x in claimed]
+        await self._sample([id for id, c in zip(ids, claimed) if c], spider_name)
+        return claimed
+
+    async def migrate(
+        self, spider_names: List[str], chunk_size: int = 1000, delete: bool = False
+    ) -> Tuple[int, int]:
+        """
+        Copy the members of the legacy PROCESSED_IDS_ZSET into per-day buckets,
+        streaming it with ZSCAN in chunks of `chunk_size`.
+        Members are matched against `spider_names` (longest prefix wins) since
+        spider names may themselves contain underscores. The legacy set must hold
+        plain text ids, they are digested here if a digest is configured.
+        Returns the number of migrated and skipped members.
+        """
+        prefixes = sorted((f"{name}_" for name in spider_names), key=len, reverse=True)
+        threshold = time.time() - self.days * 24 * 60 * 60 if self.days else 0
+        migrated = skipped = 0
+        cursor = 0
+        while True:
+            cursor, members = await self.r.zscan(
+                self.PROCESSED_IDS_ZSET, cursor, count=chunk_size
+            )
+            async with self.r.pipeline(transaction=False) as pipe:
+                done = []
+                for member, score in members:
+                    plain = member.decode()
+                    prefix = next((p for p in prefixes if plain.startswith(p)), None)
+                    if prefix is None or score < threshold:
+                        skipped += 1
+                        continue
+                    spider_name = prefix[:-1]
+                    key = self.bucket(spider_name, score)
+                    pipe.sadd(key, self._member(plain[len(prefix):], spider_name))
+                    if self.days:
+                        pipe.expireat(key, self.expire_at(score))
+                    done.append(member)
+                if delete and done:
+                    pipe.zrem(self.PROCESSED_IDS_ZSET, *done)
+                await pipe.execute()
+            migrated += len(done)
+            if cursor == 0:
+                break
+        return migrated, skipped
+
+
+class RedisBloomDB(RedisDB):
+    """
+    Probabilistic dedup store, a scalable Bloom filter kept in Redis bitmaps.
+    Every spider gets one generation per day expiring with EXPIREAT, so cleanup needs
+    no rebuild. A generation grows new slices (twice as large, with a tighter error rate)
+    once `capacity` ids are inserted. A lookup checks all `days + 1` generations, so each
+    is sized for `error_rate / (days + 1)` to keep the error rate of a lookup within
+    `error_rate`.
+    Bloom filters cannot forget, removed ids are tracked in a small set instead.
+    """
+
+    PREFIX: str = "processed:bloom"
+    GROWTH: int = 2
+    TIGHTENING: float = 0.5
+    # KEYS: the removed set, then per generation (today's first) its count key
+    #   followed by its `slices` slice bitmaps
+    # ARGV: slices, expire-at of today's generation (0 = never), the capacity then the
+    #   number of hashes of every slice, then per id the id followed by its positions
+    #   in every slice
+    # Returns {claimed, counts}, or {-1} when the generations need more slices.
+    CLAIM_SCRIPT: str = """
+        local slices = tonumber(ARGV[1])
+        local capacity, hashes = {}, {}
+        for i = 1, slices do
+            capacity[i] = tonumber(ARGV[2 + i])
+            hashes[i] = tonumber(ARGV[2 + slices + i])
+        end
+        -- slice receiving the insert number `count` (0-based) of a generation
+        local function slice(count)
+            local i = 1
+            while i <= slices and count >= capacity[i] do
+                count = count - capacity[i]
+                i = i + 1
+            end
+            return i
+        end
+        local generations = (#KEYS - 1) / (slices + 1)
+        local counts = {}
+        for g = 1, generations do
+            counts[g] = tonumber(redis.call('GET', KEYS[2 + (g - 1) * (slices + 1)]) or '0')
+            if slice(math.max(counts[g] - 1, 0)) > slices then
+                return {-1}
+            end
+        end
+        local per_id = 1
+        for i = 1, slices do
+            per_id = per_id + hashes[i]
+        end
+        local ids = (#ARGV - 2 - 2 * slices) / per_id
+        if slice(counts[1] + ids - 1) > slices then
+            return {-1}
+        end
+
+        local claimed, touched = {}, {}
+        local pos = 3 + 2 * slices
+        for j = 1, ids do
+            local id = ARGV[pos]
+            local offsets = {}
+            pos = pos + 1
+            for i = 1, slices do
+                offsets[i] = pos
+                pos = pos + hashes[i]
+            end
+            local found = false
+            -- removed ids are claimed again
+            if redis.call('SISMEMBER', KEYS[1], id) == 0 then
+                for g = 1, generations do
+                    if counts[g] > 0 then
+                        for i = 1, slice(counts[g] - 1) do
+                            local args = {}
+                            for h = 0, hashes[i] - 1 do
+                                table.insert(args, 'GET')
+                                table.insert(args, 'u1')
+                                table.insert(args, ARGV[offsets[i] + h])
+                            end
+                            local bits = redis.call(
+                                'BITFIELD', KEYS[2 + (g - 1) * (slices + 1) + i], unpack(args)
+                            )
+                            found = true
+                            for _, bit in ipairs(bits) do
+                                if bit == 0 then
+                                    found = false
+                                    break
+                                end
+                            end
+                            if found then
+                                break
+                            end
+                        end
+                    end
+                    if found then
+                        break
+                    end
+                end
+            end
+            if not found then
+                local i = slice(counts[1])
+                local args = {}
+                for h = 0, hashes[i] - 1 do
+                    table.insert(args, 'SET')
+                    table.insert(args, 'u1')
+                    table.insert(args, ARGV[offsets[i] + h])
+                    table.insert(args, 1)
+                end
+                redis.call('BITFIELD', KEYS[2 + i], unpack(args))
+                redis.call('SREM', KEYS[1], id)
+                touched[i] = true
+                counts[1] = counts[1] + 1
+            end
+            claimed[j] = found and 0 or 1
+        end
+        local added = counts[1] - tonumber(redis.call('GET', KEYS[2]) or '0')
+        if added > 0 then
+            redis.call('INCRBY', KEYS[2], added)
+            if ARGV[2] ~= '0' then
+                redis.call('EXPIREAT', KEYS[2], ARGV[2])
+                for i in pairs(touched) do
+                    redis.call('EXPIREAT', KEYS[2 + i], ARGV[2])
+                end
+            end
+        end
+        return {claimed, counts}
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1_000_000,
+        error_rate: float = 0.001,
+        days: int = 15,
+        stats: StatsCollector | None = None,
+        registry: RedisRegistry | None = None,
+    ) -> None:
+        super().__init__(stats=stats, registry=registry)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.days = days
+        self._slice_params: List[Tuple[int, int, int]] = []
+        # slices per generation passed to the claim script, grown when it asks for more
+        self._slices: Dict[str, int] = {}
+
+    async def connect(self, host: str = "localhost", port: int = 6379, password: str = None) -> None:
+        await super().connect(host, port, password)
+        self._claim_script = self.r.register_script(self.CLAIM_SCRIPT)
+
+    def generation(self, spider_name: str, timestamp: float) -> str:
+        if not self.days:
+            return f"{self.PREFIX}:{{{spider_name}}}:all"
+        day = time.strftime("%Y%m%d", time.gmtime(timestamp))
+        return f"{self.PREFIX}:{{{spider_name}}}:{day}"
+
+    def generations(self, spider_name: str) -> List[str]:
+        now = time.time()
+        if not self.days:
+            return [self.generation(spider_name, now)]
+        return [self.generation(spider_name, now - d * 24 * 60 * 60) for d in range(self.days + 1)]
+
+    def expire_at(self, timestamp: float) -> int:
+        day_start = int(timestamp) - int(timestamp) % (24 * 60 * 60)
+        return day_start + (self.days + 1) * 24 * 60 * 60
+
+    def slice_params(self, index: int) -> Tuple[int, int, int]:
+        """
+        Returns capacity, number of bits and number of hashes of the slice `index`.
+        """
+        while len(self._slice_params) <= index:
+            i = len(self._slice_params)
+            capacity = self.capacity * self.GROWTH**i
+            # false positives of the generations add up, split the budget between them
+            generation_rate = self.error_rate / (self.days + 1)
+            error_rate = generation_rate * (1 - self.TIGHTENING) * self.TIGHTENING**i
+            bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+            hashes = max(1, round(bits / capacity * math.log(2)))
+            self._slice_params.append((capacity, bits, hashes))
+        return self._slice_params[index]
+
+    def slice_index(self, count: int) -> int:
+        """
+        Index of the slice receiving the next insert of a generation holding `count` ids.
+        """
+        index = 0
+        while count >= self.slice_params(index)[0]:
+            count -= self.slice_params(index)[0]
+            index += 1
+        return index
+
+    def positions(self, id: str, spider_name: str, index: int) -> List[int]:
+        # double hashing: the k positions are derived from two 64 bits hashes
+        digest = hashlib.blake2b(f"{spider_name}_{id}".encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        _, bits, hashes = self.slice_params(index)
+        return [(h1 + i * h2) % bits for i in range(hashes)]
+
+    async def _lookup(
+        self, ids: List[str], spider_name: str
+    ) -> Tuple[List[bool], List[str], List[int]]:
+        generations = self.generations(spider_name)
+        counts = [int(x or 0) for x in await self.r.mget([f"{g}:count" for g in generations])]
+        async with self.r.pipeline(transaction=False) as pipe:
+            for id in ids:
+                for generation, count in zip(generations, counts):
+                    if not count:
+                        continue
+                    for index in range(self.slice_index(count - 1) + 1):
+                        args = []
+                        for position in self.positions(id, spider_name, index):
+                            args += ["GET", "u1", position]
+                        pipe.execute_command("BITFIELD", f"{generation}:{index}", *args)
+            pipe.smismember(f"{self.PREFIX}:{{{spider_name}}}:removed", ids)
+            results = await pipe.execute()
+        removed = results.pop()
+        found, results = [], iter(results)
+        for _, is_removed in zip(ids, removed):
+            hit = False
+            for count in counts:
+                if not count:
+                    continue
+                for _ in range(self.slice_index(count - 1) + 1):
+                    hit = all(next(results)) or hit
+            found.append(hit and not is_removed)
+        return found, generations, counts
+
+    async def exists_many(self, ids: List[str], spider_name: str) -> List[bool]:
+        found, _, _ = await self._lookup(ids, spider_name)
+        return found
+
+    async def claim_many(self, ids: List[str], spider_name: str) -> List[bool]:
+        if not ids:
+            return []
+        generations = self.generations(spider_name)
+        expire_at = self.expire_at(time.time()) if self.days else 0
+        slices = self._slices.get(spider_name, 1)
+        while True:
+            keys = [f"{self.PREFIX}:{{{spider_name}}}:removed"]
+            for generation in generations:
+                keys.append(f"{generation}:count")
+                keys += [f"{generation}:{index}" for index in range(slices)]
+            params = [self.slice_params(index) for index in range(slices)]
+            args = [slices, expire_at]
+            args += [capacity for capacity, _, _ in params]
+            args += [hashes for _, _, hashes in params]
+            for id in ids:
+                args.append(id)
+                for index in range(slices):
+                    args += self.positions(id, spider_name, index)
+            # lookup and insert in one script, so concurrent claims can't both win
+            result = await self._claim_script(keys=keys, args=args)
+            if result[0] != -1:
+                break
+            slices += 1
+            self._slices[spider_name] = slices
+        claimed, counts = result
+        self._record_stats([int(count) for count in counts])
+        return [bool(c) for c in claimed]
+
+    async def insert_many(self, ids: List[str], spider_name: str) -> None:
+        await self.claim_many(ids, spider_name)
+
+    async def insert(self, id: str, spider_name: str) -> None:
+        await self.insert_many([id], spider_name)
+
+    async def exists(self, id: str, spider_name: str) -> bool:
+        return (await self.exists_many([id], spider_name))[0]
+
+    async def claim(self, id: str, spider_name: str) -> bool:
+        return (await self.claim_many([id], spider_name))[0]
+
+    async def remove(self, id: str, spider_name: str) -> None:
+        key = f"{self.PREFIX}:{{{spider_name}}}:removed"
+        async with self.r.pipeline(transaction=False) as pipe:
+            pipe.sadd(key, id)
+            if self.days:
+                pipe.expire(key, (self.days + 1) * 24 * 60 * 60)
+            await pipe.execute()
+
+    async def cleanup(self, days: int) -> None:
+        # generations expire on their own
+        pass
+
+    def _record_stats(self, counts: List[int]) -> None:
+        """
+        Estimate the fill ratio of the slice currently written to and the
+        false positive probability of a lookup across all live generations.
+        """
+        if not self.stats:
+            return
+        miss_probability = 1.0
+        for count in counts:
+            for index in range(self.slice_index(max(count - 1, 0)) + 1):
+                capacity, bits, hashes = self.slice_params(index)
+                inserted = min(max(count, 0), capacity)
+                count -= capacity
+                fill = 1 - math.exp(-hashes * inserted / bits)
+                miss_probability *= 1 - fill**hashes
+        capacity, bits, hashes = self.slice_params(self.slice_index(counts[0]))
+        inserted = counts[0] - sum(
+            self.slice_params(i)[0] for i in range(self.slice_index(counts[0]))
+        )
+        self.stats.set_value(
+            "zen/db/bloom/fill_ratio", f"{1 - math.exp(-hashes * inserted / bits):.4f}"
+        )
+        self.stats.set_value(
+            "zen/db/bloom/false_positive_rate", f"{1 - miss_probability:.6f}"
+        )
+
+
+class SQLiteDB(DB):
+    """
+    Embedded dedup store, a SQLite file in WAL mode under ZEN_JOBDIR.
+    Writes are committed in batches of `commit_every` (or after `commit_interval` seconds),
+    every instance opened on the same file shares one connection so pending writes
+    are visible to all of them.
+    """
+
+    settings: List[str] = ["ZEN_JOBDIR"]
+    FILENAME: str = "processed_ids.sqlite3"
+    _connections: Dict[str, "_SQLiteConnection"] = {}
+
+    def __init__(self, commit_every: int = 100, commit_interval: float = 1.0) -> None:
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+
+    async def connect(self, path: str) -> None:
+        Path(path).mkdir(parents=True, exist_ok=True)
+        file = str(Path(path, self.FILENAME))
+        if file not in self._connections:
+            self._connections[file] = _SQLiteConnection(
+                file, self.commit_every, self.commit_interval
+            )
+        self.conn = self._connections[file]
+        self.conn.users += 1
+
+    async def insert(self, id: str, spider_name: str) -> None:
+        self.conn.write(
+            "INSERT OR REPLACE INTO ids (spider, id, ts) VALUES (?, ?, ?)",
+            (spider_name, id, int(time.time())),
+        )
+
+    async def exists(self, id: str, spider_name: str) -> bool:
+        row = self.conn.db.execute(
+            "SELECT 1 FROM ids WHERE spider = ? AND id = ?", (spider_name, id)
+        ).fetchone()
+        return row is not None
+
+    async def claim(self, id: str, spider_name: str) -> bool:
+        cursor = self.conn.write(
+            "INSERT OR IGNORE INTO ids (spider, id, ts) VALUES (?, ?, ?)",
+            (spider_name, id, int(time.time())),
+        )
+        return cursor.rowcount == 1
+
+    async def remove(self, id: str, spider_name: str) -> None:
+        self.conn.write("DELETE FROM ids WHERE spider = ? AND id = ?", (spider_name, id))
+
+    async def cleanup(self, days: int, chunk_size: int = 1000) -> None:
+        threshold_timestamp = int(time.time()) - (days * 24 * 60 * 60)
+        while True:
+            cursor = self.conn.write(
+                "DELETE FROM ids WHERE (spider, id) IN "
+                "(SELECT spider, id FROM ids WHERE ts < ? LIMIT ?)",
+                (threshold_timestamp, chunk_size),
+            )
+            if cursor.rowcount < chunk_size:
+                break
+            await asyncio.sleep(0)
+
+    async def close(self) -> None:
+        if not hasattr(self, "conn"):
+            return
+        self.conn.users -= 1
+        if self.conn.users <= 0:
+            self.conn.close()
+            self._connections.pop(self.conn.path, None)
+
+
+class _SQLiteConnection:
+    """
+    Connection shared by the SQLiteDB instances of one file, batches writes in transactions.
+    """
+
+    def __init__(self, path: str, commit_every: int, commit_interval: float) -> None:
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.users = 0
+        self.pending = 0
+        self.timer: asyncio.TimerHandle | None = None
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS ids ("
+            "spider TEXT NOT NULL, id TEXT NOT NULL, ts INTEGER NOT NULL, "
+            "PRIMARY KEY (spider, id)) WITHOUT ROWID"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS ids_ts ON ids (ts)")
+
+    def write(self, sql: str, params: Tuple) -> sqlite3.Cursor:
+        if not self.db.in_transaction:
+            self.db.execute("BEGIN")
+        cursor = self.db.execute(sql, params)
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.commit()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(
+                self.commit_interval, self.commit
+            )
+        return cursor
+
+    def commit(self) -> None:
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if self.db.in_transaction:
+            self.db.execute("COMMIT")
+        self.pending = 0
+
+    def close(self) -> None:
+        self.commit()
+        self.db.close()
+
+
+class DBWrapper(DB):
+    """
+    Base class for layers that wrap another DB, delegates everything by default.
+    """
+
+    def __init__(self, db: DB) -> None:
+        self.db = db
+
+    @property
+    def settings(self) -> List[str]:
+        return self.db.settings
+
+    async def connect(self, *args: Any, **kwargs: Any) -> None:
+        await self.db.connect(*args, **kwargs)
+
+    async def insert(self, id: str, spider_name: str) -> None:
+        await self.db.insert(id, spider_name)
+
+    async def exists(self, id: str, spider_name: str) -> bool:
+        return await self.db.exists(id, spider_name)
+
+    async def claim(self, id: str, spider_name: str) -> bool:
+        return await self.db.claim(id, spider_name)
+
+    async def remove(self, id: str, spider_name: str) -> None:
+        await self.db.remove(id, spider_name)
+
+    async def cleanup(self, days: int) -> None:
+        await self.db.cleanup(days)
+
+    async def close(self) -> None:
+        await self.db.close()
+
+    async def insert_many(self, ids: List[str], spider_name: str) -> None:
+        await self.db.insert_many(ids, spider_name)
+
+    async def exists_many(self, ids: List[str], spider_name: str) -> List[bool]:
+        return await self.db.exists_many(ids, spider_name)
+
+    async def claim_many(self, ids: List[str], spider_name: str) -> List[bool]:
+        return await self.db.claim_many(ids, spider_name)
+
+
+class BatchedDB(DBWrapper):
+    """
+    Coalesces lookups and inserts issued by concurrent coroutines into batches.
+    Pending calls are collected for `window` seconds (or until `max_size` is reached)
+    and sent to the wrapped DB as a single call of its `*_many` method.
+    """
+
+    def __init__(
+        self,
+        db: DB,
+        window: float = 0.002,
+        max_size: int = 100,
+        stats: StatsCollector | None = None,
+    ) -> None:
+        super().__init__(db)
+        self.window = window
+        self.max_size = max_size
+        self.stats = stats
+        self._pending: Dict[Tuple[str, str], List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        self._flushes: set[asyncio.Task] = set()
+        self.batch_count = 0
+        self.batch_items = 0
+        self.total_latency = 0.0
+
+    async def insert(self, id: str, spider_name: str) -> None:
+        await self._submit("insert", id, spider_name)
+
+    async def exists(self, id: str, spider_name: str) -> bool:
+        return await self._submit("exists", id, spider_name)
+
+    async def claim(self, id: str, spider_name: str) -> bool:
+        return await self._submit("claim", id, spider_name)
+
+    async def close(self) -> None:
+        for key in list(self._pending):
+            self._flush_now(key)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        if self.stats and self.batch_count:
+            self.stats.set_value(
+                "zen/db/batch/avg_size", f"{self.batch_items / self.batch_count:.2f}"
+            )
+            self.stats.set_value(
+                "zen/db/batch/avg_flush_latency_ms",
+                f"{self.total_latency * 1000 / self.batch_count:.2f}",
+            )
+        await self.db.close()
+
+    def _submit(self, op: str, id: str, spider_name: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        key = (op, spider_name)
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((id, future))
+        if len(batch) >= self.max_size:
+            self._flush_now(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.window, self._flush_now, key)
+        return future
+
+    def _flush_now(self, key: Tuple[str, str]) -> None:
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._flush(key, batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(
+        self, key: Tuple[str, str], batch: List[Tuple[str, asyncio.Future]]
+    ) -> None:
+        op, spider_name = key
+        ids = [id for id, _ in batch]
+        start = time.monotonic()
+        try:
+            results = await getattr(self.db, f"{op}_many")(ids, spider_name)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        latency = time.monotonic() - start
+        if results is None:
+            results = [None] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+        self.batch_count += 1
+        self.batch_items += len(batch)
+        self.total_latency += latency
+        if self.stats:
+            self.stats.inc_value("zen/db/batch/count")
+            self.stats.inc_value("zen/db/batch/items", len(batch))
+            self.stats.max_value("zen/db/batch/max_size", len(batch))
+            self.stats.max_value("zen/db/batch/max_flush_latency_ms", int(latency * 1000))
+
+
+class SeenCache:
+    """
+    Bounded in-process set of seen ids with LRU eviction and per-entry TTL.
+    """
+
+    def __init__(self, max_size: int = 100_000, ttl: float | None = None) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Tuple[str, str], float | None] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        if key not in self._entries:
+            return False
+        expires_at = self._entries[key]
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return False
+        self._entries.move_to_end(key)
+        return True
+
+    def add(self, key: Tuple[str, str], max_ttl: float | None = None) -> None:
+        ttl = min(self.ttl, max_ttl) if self.ttl and max_ttl else self.ttl
+        self._entries[key] = time.monotonic() + ttl if ttl else None
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: Tuple[str, str]) -> None:
+        self._entries.pop(key, None)
+
+
+class CachedDB(DBWrapper):
+    """
+    Answers repeated lookups of known-seen ids from a local SeenCache,
+    only misses reach the wrapped DB.
+    """
+
+    # ids the DB already had may be close to their expiry there, their age is unknown
+    SEEN_TTL: float = 24 * 60 * 60
+
+    def __init__(
+        self, db: DB, cache: SeenCache, stats: StatsCollector | None = None
+    ) -> None:
+        super().__init__(db)
+        self.cache = cache
+        self.stats = stats
+
+    def _hit(self, key: Tuple[str, str]) -> bool:
+        if key in self.cache:
+            if self.stats:
+                self.stats.inc_value("zen/db/cache/hits")
+            return True
+        if self.stats:
+            self.stats.inc_value("zen/db/cache/misses")
+        return False
+
+    async def insert(self, id: str, spider_name: str) -> None:
+        await self.db.insert(id, spider_name)
+        self.cache.add((spider_name, id))
+
+    async def exists(self, id: str, spider_name: str) -> bool:
+        key = (spider_name, id)
+        if self._hit(key):
+            return True
+        exists = await self.db.exists(id, spider_name)
+        if exists:
+            self.cache.add(key, self.SEEN_TTL)
+        return exists
+
+    async def claim(self, id: str, spider_name: str) -> bool:
+        key = (spider_name, id)
+        if self._hit(key):
+            return False
+        claimed = await self.db.claim(id, spider_name)
+        self.cache.add(key, None if claimed else self.SEEN_TTL)
+        return claimed
+
+    async def remove(self, id: str, spider_name: str) -> None:
+        self.cache.discard((spider_name, id))
+        await self.db.remove(id, spider_name)
+
+    async def close(self) -> None:
+        if self.stats:
+            self.stats.set_value("zen/db/cache/size", len(self.cache))
+        await self.db.close()
+
+
+# caches are shared by every DB built for the same crawler, so that a remove()
+# issued by one pipeline invalidates the entries seen by the others
+_caches: WeakKeyDictionary[Crawler, SeenCache] = WeakKeyDictionary()
+
+
+def _redis_db(crawler: Crawler) -> RedisDB:
+    settings = crawler.settings
+    digest = settings.get("DB_ID_DIGEST")
+    debug_sample = settings.getfloat("DB_ID_DIGEST_DEBUG_SAMPLE", 0.0)
+    registry = RedisRegistry.from_crawler(crawler)
+    if settings.get("DB_KEY_LAYOUT", "zset") == "buckets":
+        return BucketedRedisDB(
+            days=settings.getint("DB_EXPIRY_DAYS", 15),
+            digest=digest,
+            debug_sample=debug_sample,
+            registry=registry,
+        )
+    return RedisDB(
+        digest=digest,
+        debug_sample=debug_sample,
+        cleanup_chunk_size=settings.getint("DB_CLEANUP_CHUNK_SIZE", 1000),
+        cleanup_pause=settings.getfloat("DB_CLEANUP_PAUSE_MS", 50) / 1000,
+        cleanup_interval=settings.getint("DB_CLEANUP_INTERVAL", 60 * 60),
+        stats=crawler.stats,
+        registry=registry,
+    )
+
+
+def db_from_crawler(crawler: Crawler) -> DB:
+    """
+    Build the dedup DB configured for this crawler.
+    """
+    settings = crawler.settings
+    db: DB
+    backend = settings.get("ZEN_DB_BACKEND", "redis")
+    if backend == "redis":
+        db = _redis_db(crawler)
+    elif backend == "bloom":
+        db = RedisBloomDB(
+            capacity=settings.getint("DB_BLOOM_CAPACITY", 1_000_000),
+            error_rate=settings.getfloat("DB_BLOOM_ERROR_RATE", 0.001),
+            days=settings.getint("DB_EXPIRY_DAYS", 15),
+            stats=crawler.stats,
+            registry=RedisRegistry.from_crawler(crawler),
+        )
+    elif backend == "sqlite":
+        db = SQLiteDB(
+            commit_every=settings.getint("DB_SQLITE_COMMIT_EVERY", 100),
+            commit_interval=settings.getfloat("DB_SQLITE_COMMIT_INTERVAL", 1.0),
+        )
+    else:
+        raise ValueError(f"Unknown ZEN_DB_BACKEND {backend!r}, expected redis, bloom or sqlite")
+    if settings.getbool("DB_BATCH_ENABLED"):
+        db = BatchedDB(
+            db,
+            window=settings.getfloat("DB_BATCH_WINDOW_MS", 2) / 1000,
+            max_size=settings.getint("DB_BATCH_MAX_SIZE", 100),
+            stats=crawler.stats,
+        )
+    if settings.getbool("DB_CACHE_ENABLED"):
+        if crawler not in _caches:
+            days = settings.getint("DB_EXPIRY_DAYS", 15)
+            _caches[crawler] = SeenCache(
+                max_size=settings.getint("DB_CACHE_SIZE", 100_000),
+                ttl=days * 24 * 60 * 60 if days else None,
+            )
+        db = CachedDB(db, _caches[crawler], stats=crawler.stats)
+    return db
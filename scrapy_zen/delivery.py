@@ -0,0 +1,647 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from collections import deque
+from weakref import WeakKeyDictionary
+from typing import (
+    TYPE_CHECKING,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Self,
+    Sequence,
+    Tuple,
+)
+
+from scrapy import signals
+from scrapy.crawler import Crawler
+from scrapy.spiders import Spider
+from scrapy.statscollectors import StatsCollector
+
+if TYPE_CHECKING:
+    from scrapy_zen.clients import SinkResponse
+
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250)
+LATENCY_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def observe(
+    stats: StatsCollector | None, key: str, value: float, buckets: Sequence[float]
+) -> None:
+    """
+    Record `value` in a non-cumulative histogram under `{key}/le_{bucket}` stats.
+    """
+    if not stats:
+        return
+    for bucket in buckets:
+        if value <= bucket:
+            stats.inc_value(f"{key}/le_{bucket}")
+            return
+    stats.inc_value(f"{key}/le_inf")
+
+
+def dumps(obj: object) -> bytes:
+    """
+    JSON-encode `obj` to bytes, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj).encode()
+
+
+def payload(
+    item: Dict,
+    exclude_fields: Sequence[str] = (),
+    transform: Callable[[str, object], object] | None = None,
+    name: str = "",
+) -> bytes:
+    """
+    JSON of the item's public fields minus `exclude_fields`, encoded once per distinct
+    projection and cached for every sink sharing it until `release_payloads(item)`.
+    Sinks transforming values pass `transform(key, value)` and a `name` to key it by.
+    """
+    exclude = {field.lower() for field in exclude_fields}
+    key = (name, *sorted(exclude))
+    entry = _payloads.get(id(item))
+    # the entry holds the item, so its id can't be reused while it is cached
+    if entry is None or entry[0] is not item:
+        entry = _payloads[id(item)] = (item, {})
+    cache = entry[1]
+    if key not in cache:
+        cache[key] = dumps(
+            {
+                k: transform(k, v) if transform else v
+                for k, v in item.items()
+                if not k.startswith("_") and k.lower() not in exclude
+            }
+        )
+    return cache[key]
+
+
+def release_payloads(item: Dict) -> None:
+    """
+    Drop the payloads cached for `item`. Connected to item_scraped, item_dropped and
+    item_error by `register_sink`.
+    """
+    _payloads.pop(id(item), None)
+
+
+# kept off the item, exporters can't serialize tuple keys and bytes
+_payloads: Dict[int, Tuple[Dict, Dict[Tuple[str, ...], bytes]]] = {}
+
+
+def join_payloads(payloads: List[bytes]) -> bytes:
+    return b"[" + b",".join(payloads) + b"]"
+
+
+class ItemBatcher:
+    """
+    Buffers items and hands them to `send` as one batch once `max_size` items are
+    pending or `interval` seconds passed since the first one. Each `add` resolves to
+    the per-item delivery result returned by `send`.
+
+    Attributes:
+        name (str): sink name used in stats keys
+        send (Callable): coroutine taking (items, spider), returns a list of booleans
+        max_size (int): flush when this many items are pending
+        interval (float): max seconds an item waits in the buffer
+    """
+
+    def __init__(
+        self,
+        name: str,
+        send: Callable[[List[Dict], Spider], Awaitable[List[bool]]],
+        max_size: int,
+        interval: float,
+        stats: StatsCollector | None = None,
+    ) -> None:
+        self.name = name
+        self.send = send
+        self.max_size = max_size
+        self.interval = interval
+        self.stats = stats
+        self._pending: List[Tuple[Dict, asyncio.Future, float]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushes: set[asyncio.Task] = set()
+        self._spider: Spider | None = None
+
+    async def add(self, item: Dict, spider: Spider) -> bool:
+        loop = asyncio.get_running_loop()
+        self._spider = spider
+        future = loop.create_future()
+        self._pending.append((item, future, time.monotonic()))
+        if len(self._pending) >= self.max_size:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.interval, self._flush_now)
+        return await future
+
+    async def close(self) -> None:
+        self._flush_now()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def _flush_now(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[Dict, asyncio.Future, float]]) -> None:
+        items = [item for item, _, _ in batch]
+        try:
+            results = await self.send(items, self._spider)
+        except Exception as e:
+            self._spider.logger.error(
+                f"Failed to send batch of {len(items)} to {self.name}\n{str(e)}"
+            )
+            results = [False] * len(batch)
+        now = time.monotonic()
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(bool(result))
+
+        if self.stats:
+            prefix = f"zen/{self.name}/batch"
+            self.stats.inc_value(f"{prefix}/count")
+            self.stats.inc_value(f"{prefix}/items", len(batch))
+            self.stats.inc_value(
+                f"{prefix}/failed", len(batch) - sum(map(bool, results))
+            )
+            observe(self.stats, f"{prefix}/size", len(batch), SIZE_BUCKETS)
+            observe(
+                self.stats,
+                f"{prefix}/flush_latency_ms",
+                (now - batch[0][2]) * 1000,
+                LATENCY_BUCKETS_MS,
+            )
+
+
+def batch_results(response: "SinkResponse", size: int) -> List[bool]:
+    """
+    Resolve per-item results of a batch POST. A non-2xx response fails the whole batch;
+    a JSON array body of the same length decides per item (`true`/`false`, or objects
+    with an `ok` flag or a `status` code), anything else counts as all delivered.
+    """
+    if not 200 <= response.status < 300:
+        return [False] * size
+    try:
+        body = response.json()
+    except Exception:
+        return [True] * size
+    if isinstance(body, dict):
+        body = body.get("results")
+    if not isinstance(body, list) or len(body) != size:
+        return [True] * size
+    results = []
+    for entry in body:
+        if isinstance(entry, dict):
+            if "ok" in entry:
+                entry = entry["ok"]
+            elif "status" in entry:
+                entry = 200 <= int(entry["status"]) < 300
+        results.append(bool(entry))
+    return results
+
+
+class DeliveryBuffer:
+    """
+    Bounded FIFO of pending deliveries. Once `max_size` entries are held in memory, new
+    ones spill to an append-only file of length-prefixed records when `spill_path` is
+    set, otherwise `put` waits for room. Records left in the file are replayed by the
+    next run.
+
+    Attributes:
+        name (str): sink name used in stats keys
+        max_size (int): max entries kept in memory
+        spill_path (str): file to spill to, or None to apply backpressure instead
+        serialize (Callable): entry -> bytes, required with `spill_path`
+        deserialize (Callable): bytes -> entry, required with `spill_path`
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_size: int,
+        spill_path: str | None = None,
+        serialize: Callable[[object], bytes] | None = None,
+        deserialize: Callable[[bytes], object] | None = None,
+        stats: StatsCollector | None = None,
+    ) -> None:
+        self.name = name
+        self.max_size = max_size
+        self.spill_path = spill_path
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.stats = stats
+        self.memory: deque = deque()
+        self.changed = asyncio.Event()
+        self.spilled = 0
+        self.read_offset = 0
+        self._spill_file = None
+        if spill_path and os.path.exists(spill_path):
+            self.spilled = sum(1 for _ in self._read_spill(0))
+
+    def __len__(self) -> int:
+        return len(self.memory) + self.spilled
+
+    async def put(self, entry: object) -> None:
+        while len(self.memory) >= self.max_size or self.spilled:
+            if self.spill_path:
+                self._spill(entry)
+                self._record()
+                return
+            self.changed.clear()
+            await self.changed.wait()
+        self.memory.append(entry)
+        self._notify()
+
+    def put_back(self, entry: object) -> None:
+        # failed deliveries go first again, even if that overshoots max_size
+        self.memory.appendleft(entry)
+        self._notify()
+
+    async def get(self) -> object:
+        while not self.memory:
+            if self.spilled:
+                self._load_spill()
+                continue
+            self.changed.clear()
+            await self.changed.wait()
+        entry = self.memory.popleft()
+        self._notify()
+        return entry
+
+    async def join(self) -> None:
+        while len(self):
+            self.changed.clear()
+            await self.changed.wait()
+
+    def close(self) -> List[object]:
+        """
+        Spill what is still in memory (when spilling is enabled), returns the entries
+        that could not be kept.
+        """
+        if self.spill_path:
+            # entries in memory are older than the spilled ones, rewrite them first
+            pending = list(self.memory)
+            if self.spilled:
+                pending += [
+                    self.deserialize(data)
+                    for _, data in self._read_spill(self.read_offset)
+                ]
+            self._close_spill()
+            if pending:
+                with open(self.spill_path, "wb") as f:
+                    for entry in pending:
+                        data = self.serialize(entry)
+                        f.write(len(data).to_bytes(4, "big") + data)
+            elif os.path.exists(self.spill_path):
+                os.remove(self.spill_path)
+            self.memory.clear()
+            self.spilled = len(pending)
+            self.read_offset = 0
+            return []
+        lost = list(self.memory)
+        self.memory.clear()
+        return lost
+
+    def _notify(self) -> None:
+        self.changed.set()
+        self._record()
+
+    def _record(self) -> None:
+        if self.stats:
+            self.stats.set_value(f"zen/{self.name}/buffer/depth", len(self))
+            self.stats.max_value(f"zen/{self.name}/buffer/max_depth", len(self))
+
+    def _spill(self, entry: object) -> None:
+        if self._spill_file is None:
+            self._spill_file = open(self.spill_path, "ab")
+        data = self.serialize(entry)
+        self._spill_file.write(len(data).to_bytes(4, "big") + data)
+        self._spill_file.flush()
+        self.spilled += 1
+        if self.stats:
+            self.stats.inc_value(f"zen/{self.name}/buffer/spilled")
+
+    def _read_spill(self, offset: int) -> Iterator[Tuple[int, bytes]]:
+        with open(self.spill_path, "rb") as f:
+            f.seek(offset)
+            while header := f.read(4):
+                size = int.from_bytes(header, "big")
+                data = f.read(size)
+                if len(data) < size:
+                    # torn write at the end of the file
+                    return
+                offset += 4 + size
+                yield offset, data
+
+    def _load_spill(self) -> None:
+        if self._spill_file is not None:
+            self._spill_file.flush()
+        loaded = 0
+        for offset, data in self._read_spill(self.read_offset):
+            self.memory.append(self.deserialize(data))
+            self.read_offset = offset
+            loaded += 1
+            if loaded >= self.max_size:
+                break
+        self.spilled -= loaded
+        if not self.spilled or not loaded:
+            # everything is back in memory, start the file over
+            self.spilled = 0
+            self._close_spill()
+            os.remove(self.spill_path)
+            self.read_offset = 0
+
+    def _close_spill(self) -> None:
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+
+_sinks: "WeakKeyDictionary[Crawler, Dict[str, object]]" = WeakKeyDictionary()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD in-flight limit for one sink. Every delivery that succeeds within
+    `target_latency` grows the limit by 1/limit (about +1 per window of `limit`
+    deliveries); a failure or a slow delivery multiplies it by `backoff`, at most once
+    per average latency so one burst of timeouts counts as one congestion event.
+
+    Attributes:
+        name (str): sink name used in stats keys
+        limit (float): current in-flight limit
+        min_limit (int):
+        max_limit (int):
+        target_latency (float): deliveries slower than this (seconds) count as congestion
+        backoff (float): multiplicative decrease factor
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        target_latency: float = 5.0,
+        backoff: float = 0.5,
+        stats: StatsCollector | None = None,
+        debug: bool = False,
+    ) -> None:
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.stats = stats
+        self.debug = debug
+        self.in_flight = 0
+        self.latency: float | None = None
+        self.last_backoff = 0.0
+        self.changed = asyncio.Event()
+
+    async def acquire(self) -> None:
+        while self.in_flight >= int(self.limit):
+            self.changed.clear()
+            await self.changed.wait()
+        self.in_flight += 1
+
+    def release(self, latency: float, ok: bool) -> None:
+        self.in_flight -= 1
+        self.latency = (
+            latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        )
+        now = time.monotonic()
+        if not ok or latency > self.target_latency:
+            if now - self.last_backoff >= self.latency:
+                self.last_backoff = now
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                if self.stats:
+                    self.stats.inc_value(f"zen/delivery/{self.name}/backoffs")
+                if self.debug:
+                    logger.info(
+                        f"{self.name}: backing off to {int(self.limit)} in flight "
+                        f"({'failed' if not ok else f'latency {latency:.2f}s'})"
+                    )
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        if self.stats:
+            self.stats.set_value(f"zen/delivery/{self.name}/limit", int(self.limit))
+            self.stats.max_value(f"zen/delivery/{self.name}/max_limit", int(self.limit))
+            self.stats.set_value(
+                f"zen/delivery/{self.name}/avg_latency_ms", f"{self.latency * 1000:.2f}"
+            )
+        self.changed.set()
+
+    def wrap(self, process_item: Callable) -> Callable:
+        @functools.wraps(process_item)
+        async def limited(item: Dict, spider: Spider) -> Dict:
+            await self.acquire()
+            start = time.monotonic()
+            ok = False
+            try:
+                item = await process_item(item, spider)
+                ok = self.name in item.get("_delivered_to", [])
+                return item
+            finally:
+                self.release(time.monotonic() - start, ok)
+
+        return limited
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler, name: str) -> Self:
+        settings = crawler.settings
+        return cls(
+            name,
+            initial=settings.getint("ZEN_DELIVERY_START_CONCURRENCY", 4),
+            min_limit=settings.getint("ZEN_DELIVERY_MIN_CONCURRENCY", 1),
+            max_limit=settings.getint("ZEN_DELIVERY_MAX_CONCURRENCY", 64),
+            target_latency=settings.getfloat("ZEN_DELIVERY_TARGET_LATENCY", 5.0),
+            backoff=settings.getfloat("ZEN_DELIVERY_BACKOFF", 0.5),
+            stats=crawler.stats,
+            debug=settings.getbool("ZEN_DELIVERY_DEBUG"),
+        )
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one sink. It opens after `failures` consecutive failed
+    deliveries, or when at least `error_rate` of the last `window` deliveries failed;
+    while open, items skip the sink without waiting for its timeout. After
+    `reset_timeout` the next item is let through as a probe (half-open): if it is
+    delivered the breaker closes, otherwise it opens again.
+
+    Attributes:
+        name (str): sink name used in stats keys
+        failures (int): consecutive failures that open the breaker
+        error_rate (float): share of failures in the window that opens the breaker
+        window (int): number of recent deliveries the error rate is computed over
+        reset_timeout (float): seconds the breaker stays open before a probe
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failures: int = 5,
+        error_rate: float = 0.5,
+        window: int = 20,
+        reset_timeout: float = 30.0,
+        stats: StatsCollector | None = None,
+    ) -> None:
+        self.name = name
+        self.failures = failures
+        self.error_rate = error_rate
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.stats = stats
+        self.state = self.CLOSED
+        self.consecutive = 0
+        self.results: deque = deque(maxlen=window)
+        self.opened_at = 0.0
+        self.probing = False
+
+    @property
+    def is_open(self) -> bool:
+        """
+        True while items would be short-circuited, i.e. open and not yet due for a probe.
+        """
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at < self.reset_timeout
+        return self.state == self.HALF_OPEN and self.probing
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._transition(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            # one probe at a time, other items skip the sink until it is answered
+            if self.probing:
+                return False
+            self.probing = True
+        return True
+
+    def record(self, ok: bool) -> None:
+        if self.state == self.HALF_OPEN:
+            self.probing = False
+            self._transition(self.CLOSED if ok else self.OPEN)
+            return
+        if self.state == self.OPEN:
+            # in flight when the breaker opened
+            return
+        self.results.append(ok)
+        self.consecutive = 0 if ok else self.consecutive + 1
+        if self.consecutive >= self.failures or (
+            len(self.results) == self.window
+            and self.results.count(False) >= self.error_rate * self.window
+        ):
+            self._transition(self.OPEN)
+
+    def _transition(self, state: str) -> None:
+        if state == self.OPEN:
+            self.opened_at = time.monotonic()
+            logger.warning(
+                f"{self.name}: circuit opened, skipping it for {self.reset_timeout}s"
+            )
+        elif state == self.CLOSED:
+            self.consecutive = 0
+            self.results.clear()
+            logger.info(f"{self.name}: circuit closed, sink recovered")
+        self.state = state
+        if self.stats:
+            self.stats.set_value(f"zen/breaker/{self.name}/state", state)
+            self.stats.inc_value(f"zen/breaker/{self.name}/{state}")
+
+    def wrap(self, process_item: Callable) -> Callable:
+        @functools.wraps(process_item)
+        async def guarded(item: Dict, spider: Spider) -> Dict:
+            if not self.allow():
+                if self.stats:
+                    self.stats.inc_value(f"zen/breaker/{self.name}/short_circuited")
+                spider.logger.debug(
+                    f"{self.name} circuit is open, skipped: {item.get('_id')}"
+                )
+                return item
+            ok = False
+            try:
+                item = await process_item(item, spider)
+                ok = self.name in item.get("_delivered_to", [])
+                return item
+            finally:
+                # a cancelled delivery (e.g. ZEN_FANOUT_TIMEOUT) counts as a failure
+                self.record(ok)
+
+        return guarded
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler, name: str) -> Self:
+        settings = crawler.settings
+        return cls(
+            name,
+            failures=settings.getint("ZEN_BREAKER_FAILURES", 5),
+            error_rate=settings.getfloat("ZEN_BREAKER_ERROR_RATE", 0.5),
+            window=settings.getint("ZEN_BREAKER_WINDOW", 20),
+            reset_timeout=settings.getfloat("ZEN_BREAKER_RESET_TIMEOUT", 30.0),
+            stats=crawler.stats,
+        )
+
+
+def register_sink(crawler: Crawler, sink: object) -> None:
+    """
+    Make a sink pipeline reachable by name (its class name) for the crawler, e.g. to
+    replay undelivered items to it. With ZEN_DELIVERY_AIMD_ENABLED its `process_item`
+    is put behind an AdaptiveLimiter, and with ZEN_BREAKER_ENABLED behind a
+    CircuitBreaker.
+    """
+    name = type(sink).__name__
+    for signal in (signals.item_scraped, signals.item_dropped, signals.item_error):
+        crawler.signals.connect(release_payloads, signal=signal)
+    # batching sinks need a full window of items in flight, their batch size bounds them
+    if crawler.settings.getbool("ZEN_DELIVERY_AIMD_ENABLED") and not getattr(
+        sink, "batcher", None
+    ):
+        sink.limiter = AdaptiveLimiter.from_crawler(crawler, name)
+        sink.process_item = sink.limiter.wrap(sink.process_item)
+    # outermost, so short-circuited items don't wait for a limiter slot
+    if crawler.settings.getbool("ZEN_BREAKER_ENABLED"):
+        sink.breaker = CircuitBreaker.from_crawler(crawler, name)
+        sink.process_item = sink.breaker.wrap(sink.process_item)
+    _sinks.setdefault(crawler, {})[name] = sink
+
+
+def get_sinks(crawler: Crawler) -> Dict[str, object]:
+    return _sinks.get(crawler, {})
+
+
+def mark_delivered(item: Dict, sink: object) -> None:
+    item["_delivered"] = True
+    delivered_to = item.setdefault("_delivered_to", [])
+    if type(sink).__name__ not in delivered_to:
+        delivered_to.append(type(sink).__name__)
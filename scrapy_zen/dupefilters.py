@@ -1,20 +1,276 @@
+from array import array
+from collections import defaultdict
 import logging
+import mmap
+import os
 from pathlib import Path
-from typing import Self
+import sys
+import threading
+from typing import BinaryIO, Callable, List, Self
+from weakref import WeakKeyDictionary
+import redis
+from scrapy.crawler import Crawler
 from scrapy.settings import BaseSettings
+from scrapy.statscollectors import StatsCollector
 import time
 from scrapy.dupefilters import RFPDupeFilter
 from scrapy.http import Request
+from scrapy.utils.defer import maybe_deferred_to_future
 from scrapy.utils.request import (
     RequestFingerprinter,
     RequestFingerprinterProtocol,
 )
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThread
 
+from scrapy_zen.databases import BucketedRedisDB, RedisRegistry
 from scrapy_zen.utils import job_dir
 
 
 
+class FingerprintSet:
+    """
+    Compact set of 64 bits fingerprint keys.
+    Open addressing with linear probing over a flat array of uint64, about
+    12-16 bytes per entry instead of 100+ for a set of hex strings.
+    The keys are already uniformly distributed hashes, so they index the table directly.
+    """
+
+    MAX_LOAD: float = 0.7
+
+    def __init__(self, capacity: int = 1 << 16) -> None:
+        size = 1 << max(capacity - 1, 1).bit_length()
+        self._table = array("Q", bytes(8 * size))
+        self._mask = size - 1
+        self._limit = int(size * self.MAX_LOAD)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: int) -> bool:
+        key = key or 1  # 0 marks an empty slot
+        table, mask = self._table, self._mask
+        i = key & mask
+        while True:
+            value = table[i]
+            if value == key:
+                return True
+            if value == 0:
+                return False
+            i = (i + 1) & mask
+
+    def add(self, key: int) -> bool:
+        """
+        Returns True if the key was not in the set yet.
+        """
+        key = key or 1
+        table, mask = self._table, self._mask
+        i = key & mask
+        while True:
+            value = table[i]
+            if value == key:
+                return False
+            if value == 0:
+                table[i] = key
+                self._size += 1
+                if self._size > self._limit:
+                    self._grow()
+                return True
+            i = (i + 1) & mask
+
+    def update(self, keys: array) -> None:
+        # size the table once for the whole batch instead of growing step by step
+        needed = int((self._size + len(keys)) / self.MAX_LOAD) + 1
+        if needed > len(self._table):
+            self._grow(1 << (needed - 1).bit_length())
+        for key in keys:
+            self.add(key)
+
+    def _grow(self, size: int | None = None) -> None:
+        old = self._table
+        size = size or len(old) * 2
+        self._table = array("Q", bytes(8 * size))
+        self._mask = size - 1
+        self._limit = int(size * self.MAX_LOAD)
+        self._size = 0
+        for key in old:
+            if key:
+                self.add(key)
+
+    @property
+    def nbytes(self) -> int:
+        return self._table.itemsize * len(self._table)
+
+    @staticmethod
+    def key(fingerprint: bytes) -> int:
+        return int.from_bytes(fingerprint[:8], "big")
+
+
+class SegmentWriter:
+    """
+    Buffers new fingerprint keys and appends them to the daily segments in bulk,
+    once `flush_size` keys are pending or `flush_interval` seconds have passed.
+
+    Attributes:
+        threaded (bool): flush from a dedicated thread instead of the reactor thread
+        fsync (str): "none" leaves durability to the OS, "batch" fsyncs every flush,
+            "interval" fsyncs at most every `fsync_interval` seconds
+    """
+
+    FSYNC_POLICIES = ("none", "interval", "batch")
+
+    def __init__(
+        self,
+        segment: Callable[[str], Path],
+        flush_size: int = 1000,
+        flush_interval: float = 1.0,
+        fsync: str = "none",
+        fsync_interval: float = 5.0,
+        threaded: bool = False,
+    ) -> None:
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}, expected one of {self.FSYNC_POLICIES}")
+        self.segment = segment
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.buffer: dict[str, array] = defaultdict(lambda: array("Q"))
+        self.pending = 0
+        self.file: BinaryIO | None = None
+        self.day: str | None = None
+        self.last_flush = self.last_fsync = time.monotonic()
+        self.flush_count = 0
+        self.flushed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.thread: threading.Thread | None = None
+        self.timer: LoopingCall | None = None
+        if threaded:
+            self.thread = threading.Thread(target=self.run, name="zen-dupefilter-writer", daemon=True)
+            self.thread.start()
+        elif flush_interval > 0:
+            # appends only check the interval, an idle crawl would keep its keys pending
+            self.timer = LoopingCall(self.flush)
+            self.timer.start(flush_interval, now=False)
+
+    def append(self, key: int, day: str) -> None:
+        with self.lock:
+            self.buffer[day].append(key)
+            self.pending += 1
+            due = (
+                self.pending >= self.flush_size
+                or time.monotonic() - self.last_flush >= self.flush_interval
+            )
+        if not due:
+            return
+        if self.thread:
+            self.wakeup.set()
+        else:
+            self.flush()
+
+    def run(self) -> None:
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            buffer, self.buffer = self.buffer, defaultdict(lambda: array("Q"))
+            self.pending = 0
+            self.last_flush = time.monotonic()
+        if not buffer:
+            return
+        start = time.monotonic()
+        for day in sorted(buffer):
+            keys = buffer[day]
+            if sys.byteorder == "big":
+                keys.byteswap()
+            if day != self.day:
+                # a long crawl rolls over to a new segment at midnight
+                self.sync()
+                if self.file:
+                    self.file.close()
+                self.file = self.segment(day).open("ab")
+                self.day = day
+            self.file.write(keys.tobytes())
+            self.flushed += len(keys)
+        self.file.flush()
+        if self.fsync == "batch" or (
+            self.fsync == "interval" and time.monotonic() - self.last_fsync >= self.fsync_interval
+        ):
+            self.sync()
+        latency = time.monotonic() - start
+        self.flush_count += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def sync(self) -> None:
+        if self.file and self.fsync != "none":
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.last_fsync = time.monotonic()
+
+    def close(self) -> None:
+        self.closed = True
+        if self.timer and self.timer.running:
+            self.timer.stop()
+        if self.thread:
+            self.wakeup.set()
+            self.thread.join()
+        self.flush()
+        self.sync()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def record_stats(self, stats: StatsCollector) -> None:
+        stats.set_value("zen/dupefilter/flush/count", self.flush_count)
+        stats.set_value("zen/dupefilter/flush/records", self.flushed)
+        stats.set_value("zen/dupefilter/flush/max_latency_ms", int(self.max_latency * 1000))
+        if self.flush_count:
+            stats.set_value(
+                "zen/dupefilter/flush/avg_latency_ms",
+                f"{self.total_latency * 1000 / self.flush_count:.2f}",
+            )
+
+
 class ZenDupeFilter(RFPDupeFilter):
+    """
+    Request dupefilter persisting fingerprints under ZEN_JOBDIR.
+
+    Fingerprints are stored as fixed-width 8 bytes records, one segment file per day
+    (requests-YYYYMMDD.seen), so loading is a bulk read and expiry just deletes the
+    segments older than ZEN_DUPEFILTER_RETENTION_DAYS. A legacy text requests.seen
+    is converted on startup. New fingerprints are written in batches by a SegmentWriter.
+
+    With ZEN_DUPEFILTER_REDIS the fingerprints live in Redis instead (per-spider, per-day
+    sets with EXPIREAT), shared by every process crawling the same spider. Known
+    fingerprints are cached locally and PrefetchDupeFilterMiddleware claims the requests
+    yielded by callbacks in batches, so request_seen rarely waits on Redis.
+    """
+
+    SEGMENT_PREFIX: str = "requests-"
+    SEGMENT_SUFFIX: str = ".seen"
+    LEGACY_FILENAME: str = "requests.seen"
+    REDIS_PREFIX: str = "requests:seen"
+    # seconds request_seen answers from local fingerprints after a Redis error
+    REDIS_RETRY_DELAY: float = 30.0
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> Self:
+        df = cls._from_settings(
+            crawler.settings, fingerprinter=crawler.request_fingerprinter
+        )
+        df.stats = crawler.stats
+        df.spider_name = crawler.spider.name
+        _dupefilters[crawler] = df
+        return df
 
     @classmethod
     def _from_settings(
@@ -24,7 +280,28 @@ class ZenDupeFilter(RFPDupeFilter):
         fingerprinter: RequestFingerprinterProtocol | None = None,
     ) -> Self:
         debug = settings.getbool("DUPEFILTER_DEBUG")
-        return cls(job_dir(settings), debug, fingerprinter=fingerprinter)
+        redis_client = None
+        if settings.getbool("ZEN_DUPEFILTER_REDIS"):
+            # same pool limits and timeouts as the shared asyncio pool of the registry
+            pool = redis.BlockingConnectionPool(
+                host=settings.get("DB_HOST"),
+                port=settings.getint("DB_PORT", 6379),
+                password=settings.get("DB_PASS"),
+                **RedisRegistry.from_settings(settings).connection_kwargs(),
+            )
+            redis_client = redis.Redis.from_pool(pool)
+        return cls(
+            job_dir(settings),
+            debug,
+            fingerprinter=fingerprinter,
+            retention_days=settings.getint("ZEN_DUPEFILTER_RETENTION_DAYS", 7),
+            flush_size=settings.getint("ZEN_DUPEFILTER_FLUSH_SIZE", 1000),
+            flush_interval=settings.getfloat("ZEN_DUPEFILTER_FLUSH_INTERVAL", 1.0),
+            fsync=settings.get("ZEN_DUPEFILTER_FSYNC", "none"),
+            fsync_interval=settings.getfloat("ZEN_DUPEFILTER_FSYNC_INTERVAL", 5.0),
+            threaded=settings.getbool("ZEN_DUPEFILTER_WRITER_THREAD"),
+            redis_client=redis_client,
+        )
 
 
     def __init__(
@@ -33,47 +310,195 @@ class ZenDupeFilter(RFPDupeFilter):
         debug: bool = False,
         *,
         fingerprinter: RequestFingerprinterProtocol | None = None,
+        retention_days: int = 7,
+        flush_size: int = 1000,
+        flush_interval: float = 1.0,
+        fsync: str = "none",
+        fsync_interval: float = 5.0,
+        threaded: bool = False,
+        redis_client: redis.Redis | None = None,
     ) -> None:
         self.file = None
+        self.writer: SegmentWriter | None = None
+        self.redis = redis_client
+        self.spider_name: str | None = None
+        self.prefetched: set[int] = set()
+        self.redis_retry_at = 0.0
+        self.path = path
+        self.retention_days = retention_days
         self.fingerprinter: RequestFingerprinterProtocol = (
             fingerprinter or RequestFingerprinter()
         )
-        self.fingerprints: set[str] = set()
+        self.seen = FingerprintSet()
+        self.stats: StatsCollector | None = None
         self.logdupes = True
         self.debug = debug
         self.logger = logging.getLogger(__name__)
-        if path:
-            self.file = Path(path, "requests.seen").open("a+", encoding="utf-8")
-            self.file.seek(0)
-            valid_entries = set()
-            for x in self.file:
-                fp, timestamp = x.rstrip().split("_")
-                if self.is_timestamp_older_than(int(timestamp), 7):
-                    continue
-                self.fingerprints.add(fp)
-                valid_entries.add(x.rstrip())
-
-            self.logger.info(f"Loaded {len(valid_entries)} entries from {path}")
-            self.file.truncate(0) # clear
-            self.file.seek(0) # move to start
-            for entry in valid_entries:
-                self.file.write(entry + "\n")
-            self.file.flush()
+        if self.redis:
+            self.claim_script = self.redis.register_script(BucketedRedisDB.CLAIM_SCRIPT)
+        elif path:
+            self.migrate_legacy_file()
+            self.load_segments()
+            self.writer = SegmentWriter(
+                self.segment,
+                flush_size=flush_size,
+                flush_interval=flush_interval,
+                fsync=fsync,
+                fsync_interval=fsync_interval,
+                threaded=threaded,
+            )
+
+
+    def segment(self, day: str) -> Path:
+        return Path(self.path, f"{self.SEGMENT_PREFIX}{day}{self.SEGMENT_SUFFIX}")
+
+
+    def load_segments(self) -> None:
+        """
+        Delete expired segments and bulk load the others.
+        """
+        oldest = self.day_of(time.time() - self.retention_days * 24 * 60 * 60)
+        loaded = 0
+        for segment in sorted(Path(self.path).glob(f"{self.SEGMENT_PREFIX}*{self.SEGMENT_SUFFIX}")):
+            day = segment.name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)]
+            if day < oldest:
+                segment.unlink()
+                continue
+            size = segment.stat().st_size - segment.stat().st_size % 8
+            if not size:
+                continue
+            with segment.open("rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as m:
+                keys = array("Q")
+                keys.frombytes(m[:size])
+            if sys.byteorder == "big":
+                keys.byteswap()
+            self.seen.update(keys)
+            loaded += len(keys)
+        self.logger.info(f"Loaded {loaded} entries from {self.path}")
+
+
+    def migrate_legacy_file(self) -> None:
+        """
+        Convert the legacy text file (one fingerprint_timestamp per line) to segments.
+        """
+        legacy = Path(self.path, self.LEGACY_FILENAME)
+        if not legacy.exists():
+            return
+        days: dict[str, array] = defaultdict(lambda: array("Q"))
+        with legacy.open(encoding="utf-8") as f:
+            for line in f:
+                fp, timestamp = line.rstrip().split("_")
+                key = FingerprintSet.key(bytes.fromhex(fp))
+                days[self.day_of(int(timestamp))].append(key)
+        for day, keys in days.items():
+            if sys.byteorder == "big":
+                keys.byteswap()
+            with self.segment(day).open("ab") as f:
+                f.write(keys.tobytes())
+        legacy.unlink()
+        self.logger.info(f"Migrated {legacy} to {len(days)} daily segments")
 
 
     def request_seen(self, request: Request) -> bool:
-        fp = self.request_fingerprint(request)
-        if fp in self.fingerprints:
+        fp = self.fingerprinter.fingerprint(request)
+        key = FingerprintSet.key(fp)
+        if self.redis:
+            return self.request_seen_remote(key)
+        if not self.seen.add(key):
             return True
-        self.fingerprints.add(fp)
-        if self.file:
-            fp = f"{fp}_{int(time.time())}"
-            self.file.write(fp + "\n")
+        if self.writer:
+            self.writer.append(key, self.day_of(time.time()))
         return False
 
 
+    def request_seen_remote(self, key: int) -> bool:
+        if key in self.prefetched:
+            # claimed for us by prefetch()
+            self.prefetched.discard(key)
+            self.seen.add(key)
+            if self.stats:
+                self.stats.inc_value("zen/dupefilter/redis/prefetched")
+            return False
+        if key in self.seen:
+            return True
+        if time.monotonic() < self.redis_retry_at:
+            return not self.seen.add(key)
+        try:
+            claimed = self.claim_remote([key])[0]
+        except redis.RedisError as e:
+            # don't fail enqueue_request, nor block the reactor on every request meanwhile
+            self.logger.warning(
+                f"Redis dupefilter unavailable, using local fingerprints for "
+                f"{self.REDIS_RETRY_DELAY}s: {str(e)}"
+            )
+            self.redis_retry_at = time.monotonic() + self.REDIS_RETRY_DELAY
+            if self.stats:
+                self.stats.inc_value("zen/dupefilter/redis/errors")
+            return not self.seen.add(key)
+        self.seen.add(key)
+        if self.stats:
+            self.stats.inc_value("zen/dupefilter/redis/sync_checks")
+        return not claimed
+
+
+    async def prefetch(self, requests: List[Request]) -> None:
+        """
+        Claim the fingerprints of `requests` in Redis with a single call made off the
+        reactor thread, request_seen then answers them from the results.
+        """
+        keys = []
+        for request in requests:
+            key = FingerprintSet.key(self.fingerprinter.fingerprint(request))
+            if key not in self.seen and key not in self.prefetched and key not in keys:
+                keys.append(key)
+        if not keys:
+            return
+        try:
+            claimed = await maybe_deferred_to_future(deferToThread(self.claim_remote, keys))
+        except redis.RedisError as e:
+            # request_seen falls back to checking them one by one
+            self.logger.warning(f"Failed to prefetch {len(keys)} fingerprints: {str(e)}")
+            if self.stats:
+                self.stats.inc_value("zen/dupefilter/redis/errors")
+            return
+        for key, c in zip(keys, claimed):
+            if c:
+                self.prefetched.add(key)
+            else:
+                self.seen.add(key)
+
+
+    def claim_remote(self, keys: List[int]) -> List[bool]:
+        now = time.time()
+        buckets = [
+            f"{self.REDIS_PREFIX}:{{{self.spider_name}}}:{self.day_of(now - d * 24 * 60 * 60)}"
+            for d in range(self.retention_days + 1)
+        ]
+        day_start = int(now) - int(now) % (24 * 60 * 60)
+        expire_at = day_start + (self.retention_days + 1) * 24 * 60 * 60
+        claimed = self.claim_script(
+            keys=buckets,
+            args=[expire_at, *[key.to_bytes(8, "little") for key in keys]],
+        )
+        return [bool(x) for x in claimed]
+
+
+    def close(self, reason: str) -> None:
+        if self.redis:
+            self.redis.close()
+        if self.writer:
+            self.writer.close()
+            if self.stats:
+                self.writer.record_stats(self.stats)
+        if self.stats:
+            self.stats.set_value("zen/dupefilter/fingerprints", len(self.seen))
+            self.stats.set_value("zen/dupefilter/memory_bytes", self.seen.nbytes)
+        super().close(reason)
+
+
     @staticmethod
-    def is_timestamp_older_than(timestamp: int, days: int) -> bool:
-        current_time = int(time.time())
-        days_in_seconds = days * 24 * 60 * 60
-        return (current_time - timestamp) > days_in_seconds
+    def day_of(timestamp: float) -> str:
+        return time.strftime("%Y%m%d", time.gmtime(timestamp))
+
+
+_dupefilters: WeakKeyDictionary[Crawler, ZenDupeFilter] = WeakKeyDictionary()
@@ -0,0 +1,150 @@
+"""
+Local stand-in for the feed ingress gRPC server, for benchmarking GRPCPipeline.
+
+    python -m scrapy_zen.grpc_server --proto-module my_contracts --port 50051
+
+It serves every method of `IngressService` from the given proto module (unary,
+client-streaming and bidi-streaming) over an insecure port, answering each message
+with an empty response that carries its `messageId` when the response type has one.
+Point the spider at it with GRPC_SERVER_URI = "localhost:50051", GRPC_SECURE = False.
+"""
+import argparse
+import asyncio
+import importlib
+import random
+import time
+
+import grpc
+from google.protobuf import message_factory
+
+
+class Stats:
+    """
+    Messages received by the stand-in, printed every few seconds.
+    """
+
+    def __init__(self) -> None:
+        self.received = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    def report(self) -> str:
+        elapsed = time.monotonic() - self.started
+        return (
+            f"received={self.received} failed={self.failed} "
+            f"rate={self.received / elapsed:.1f} msg/s"
+        )
+
+
+def build_handler(
+    service: object, delay: float, fail_rate: float, stats: Stats
+) -> grpc.GenericRpcHandler:
+    handlers = {}
+    for method in service.methods:
+        request_cls = message_factory.GetMessageClass(method.input_type)
+        response_cls = message_factory.GetMessageClass(method.output_type)
+        has_id = "messageId" in method.output_type.fields_by_name
+        has_error = "error" in method.output_type.fields_by_name
+
+        def ack(
+            message: object,
+            response_cls: type = response_cls,
+            has_id: bool = has_id,
+            has_error: bool = has_error,
+        ) -> object:
+            stats.received += 1
+            response = response_cls()
+            if has_id:
+                response.messageId = message.messageId
+            if fail_rate and random.random() < fail_rate:
+                stats.failed += 1
+                if has_error:
+                    response.error = "rejected by stand-in"
+            return response
+
+        if method.client_streaming and method.server_streaming:
+            async def handler(requests, context, ack=ack):
+                # ack concurrently, like a server processing messages in parallel
+                acks = asyncio.Queue()
+
+                async def delayed(message):
+                    await asyncio.sleep(delay)
+                    acks.put_nowait(ack(message))
+
+                async def consume():
+                    tasks = [asyncio.create_task(delayed(m)) async for m in requests]
+                    await asyncio.gather(*tasks)
+                    acks.put_nowait(None)
+
+                consumer = asyncio.create_task(consume())
+                while (response := await acks.get()) is not None:
+                    yield response
+                await consumer
+
+            wrap = grpc.stream_stream_rpc_method_handler
+        elif method.client_streaming:
+            async def handler(requests, context, ack=ack):
+                response = None
+                async for message in requests:
+                    response = ack(message)
+                if delay:
+                    await asyncio.sleep(delay)
+                return response
+
+            wrap = grpc.stream_unary_rpc_method_handler
+        else:
+            async def handler(message, context, ack=ack):
+                if delay:
+                    await asyncio.sleep(delay)
+                return ack(message)
+
+            wrap = grpc.unary_unary_rpc_method_handler
+        handlers[method.name] = wrap(
+            handler,
+            request_deserializer=request_cls.FromString,
+            response_serializer=response_cls.SerializeToString,
+        )
+    return grpc.method_handlers_generic_handler(service.full_name, handlers)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    feed_pb2 = importlib.import_module(f"{args.proto_module}.feed_pb2")
+    service = feed_pb2.DESCRIPTOR.services_by_name["IngressService"]
+    stats = Stats()
+    server = grpc.aio.server()
+    server.add_generic_rpc_handlers(
+        (build_handler(service, args.delay_ms / 1000, args.fail_rate, stats),)
+    )
+    server.add_insecure_port(f"{args.host}:{args.port}")
+    await server.start()
+    print(f"Serving {service.full_name} on {args.host}:{args.port}")
+    try:
+        while True:
+            await asyncio.sleep(args.report_interval)
+            print(stats.report())
+    finally:
+        await server.stop(grace=1.0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--proto-module", required=True, help="same module as GRPC_PROTO_MODULE"
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument(
+        "--delay-ms", type=float, default=0, help="latency added to every response"
+    )
+    parser.add_argument(
+        "--fail-rate", type=float, default=0, help="share of messages acked with an error"
+    )
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
+from typing import Any, AsyncIterator, Self
 from zoneinfo import ZoneInfo
-from scrapy import Spider
-from scrapy.exceptions import IgnoreRequest
+from scrapy import Request, Spider
+from scrapy.crawler import Crawler
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import Response
+from scrapy.statscollectors import StatsCollector
 from datetime import datetime, timedelta
-import dateparser
+
+from scrapy_zen.dupefilters import _dupefilters
+from scrapy_zen.utils import parse_date
 
 
 
@@ -13,6 +19,13 @@ class PreProcessingMiddleware:
     Handles deduplication
     """
 
+    def __init__(self, stats: StatsCollector | None = None) -> None:
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> Self:
+        return cls(crawler.stats)
+
     def process_request(self, request, spider: Spider) -> None:
         _dt = request.meta.pop("_dt", None)
         _dt_format = request.meta.pop("_dt_format", None)
@@ -29,8 +42,46 @@ class PreProcessingMiddleware:
             if not date_str:
                 return True
             utc_today = datetime.now(ZoneInfo('UTC')).date()
-            input_date = dateparser.parse(date_string=date_str, date_formats=[date_format] if date_format is not None else None).date()
+            input_date = parse_date(date_str, date_format, self.stats).date()
             return input_date >= (utc_today - timedelta(days=2))
         except Exception as e:
             spider.logger.error(f"{str(e)}: {debug_info} ")
             return False
+
+
+
+class PrefetchDupeFilterMiddleware:
+    """
+    Spider middleware claiming the requests yielded by callbacks against the
+    Redis-backed ZenDupeFilter in batches, so the scheduler does not wait on Redis per request.
+    """
+
+    def __init__(self, crawler: Crawler, batch_size: int) -> None:
+        self.crawler = crawler
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> Self:
+        if not crawler.settings.getbool("ZEN_DUPEFILTER_REDIS"):
+            raise NotConfigured
+        return cls(crawler, crawler.settings.getint("ZEN_DUPEFILTER_PREFETCH_SIZE", 100))
+
+    async def process_spider_output(
+        self, response: Response, result: AsyncIterator[Any], spider: Spider
+    ) -> AsyncIterator[Any]:
+        df = _dupefilters.get(self.crawler)
+        batch = []
+        async for x in result:
+            if df is None or not isinstance(x, Request) or x.dont_filter:
+                yield x
+                continue
+            batch.append(x)
+            if len(batch) >= self.batch_size:
+                await df.prefetch(batch)
+                for request in batch:
+                    yield request
+                batch = []
+        if batch:
+            await df.prefetch(batch)
+            for request in batch:
+                yield request
@@ -0,0 +1,50 @@
+"""
+Migrate the legacy `processed:ids:zset` into per-spider, per-day buckets.
+
+    python -m scrapy_zen.migrate --spider books --spider news --days 15
+
+Connection settings are read from the environment (DB_HOST, DB_PORT, DB_PASS).
+"""
+import argparse
+import asyncio
+import os
+
+from dotenv import load_dotenv
+
+from scrapy_zen.databases import BucketedRedisDB
+
+
+async def migrate(args: argparse.Namespace) -> None:
+    db = BucketedRedisDB(days=args.days)
+    await db.connect(
+        os.getenv("DB_HOST", "localhost"),
+        int(os.getenv("DB_PORT", 6379)),
+        os.getenv("DB_PASS"),
+    )
+    try:
+        migrated, skipped = await db.migrate(
+            args.spider, chunk_size=args.chunk_size, delete=args.delete
+        )
+    finally:
+        await db.close()
+    print(f"Migrated {migrated} ids, skipped {skipped} (unknown spider or expired)")
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--spider", action="append", required=True, help="spider name, can be repeated"
+    )
+    parser.add_argument(
+        "--days", type=int, default=15, help="DB_EXPIRY_DAYS used by the spiders"
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument(
+        "--delete", action="store_true", help="remove migrated ids from the old set"
+    )
+    asyncio.run(migrate(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Self
+from weakref import WeakKeyDictionary
+
+from scrapy import signals
+from scrapy.crawler import Crawler
+from scrapy.spiders import Spider
+
+from scrapy_zen.delivery import get_sinks, release_payloads
+from scrapy_zen.utils import job_dir
+
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """
+    Durable spool of items some sinks failed to deliver, kept as append-only JSON lines
+    under ZEN_JOBDIR. A record holds the item once and the retry state of every sink
+    that still has to receive it; a background task, and the next run at startup,
+    replays due records to those sinks with exponential backoff.
+
+    Attributes:
+        path (str): spool file
+        interval (float): seconds between replay rounds
+        max_attempts (int): replays per sink before the item is given up
+        backoff_base (float): delay before the first replay, doubled on every failure
+        backoff_max (float): max delay between replays
+        concurrency (int): items replayed at the same time
+        timeout (float): seconds a sink may take to deliver a replayed item
+        on_give_up (Callable): coroutine called with (id, spider) for given up items
+    """
+
+    def __init__(
+        self,
+        crawler: Crawler,
+        path: str,
+        interval: float = 60.0,
+        max_attempts: int = 10,
+        backoff_base: float = 30.0,
+        backoff_max: float = 3600.0,
+        concurrency: int = 8,
+        timeout: float = 60.0,
+    ) -> None:
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.path = path
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sem = asyncio.Semaphore(concurrency)
+        self.timeout = timeout
+        self.on_give_up: Callable[[str, Spider], Awaitable[None]] | None = None
+        self.records: Dict[str, Dict] = {}
+        self.garbage = 0
+        self.task: asyncio.Task = None
+        self._file = None
+        self.load()
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> Self | None:
+        if crawler in _outboxes:
+            return _outboxes[crawler]
+        if not crawler.settings.getbool("ZEN_OUTBOX_ENABLED"):
+            return None
+        path = job_dir(crawler.settings)
+        if not path:
+            logger.warning("ZEN_OUTBOX_ENABLED needs ZEN_JOBDIR, outbox is disabled")
+            return None
+        settings = crawler.settings
+        outbox = cls(
+            crawler,
+            os.path.join(path, f"outbox-{crawler.spidercls.name}.jsonl"),
+            interval=settings.getfloat("ZEN_OUTBOX_INTERVAL", 60.0),
+            max_attempts=settings.getint("ZEN_OUTBOX_MAX_ATTEMPTS", 10),
+            backoff_base=settings.getfloat("ZEN_OUTBOX_BACKOFF_BASE", 30.0),
+            backoff_max=settings.getfloat("ZEN_OUTBOX_BACKOFF_MAX", 3600.0),
+            concurrency=settings.getint("ZEN_OUTBOX_CONCURRENCY", 8),
+            timeout=settings.getfloat("ZEN_OUTBOX_TIMEOUT", 60.0),
+        )
+        crawler.signals.connect(outbox.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(outbox.spider_closed, signal=signals.spider_closed)
+        _outboxes[crawler] = outbox
+        return outbox
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # torn write at the end of the file
+                    continue
+                lines += 1
+                if record.get("done"):
+                    self.records.pop(record["id"], None)
+                else:
+                    self.records[record["id"]] = record
+        self.garbage = lines - len(self.records)
+
+    def add(self, item: Dict, sinks: List[str]) -> None:
+        now = time.time()
+        record = self.records.get(item["_id"]) or {
+            "id": item["_id"],
+            "item": {
+                k: v for k, v in item.items() if not k.startswith("_") or k == "_id"
+            },
+            "sinks": {},
+        }
+        for sink in sinks:
+            record["sinks"].setdefault(sink, {"attempts": 0, "next_at": now})
+        self._write(record)
+        if self.stats:
+            self.stats.inc_value("zen/outbox/added")
+            self.stats.set_value("zen/outbox/pending", len(self.records))
+
+    async def spider_opened(self, spider: Spider) -> None:
+        if self.records:
+            spider.logger.info(
+                f"Outbox has {len(self.records)} undelivered items to replay"
+            )
+        self.task = asyncio.create_task(self.run(spider))
+
+    async def spider_closed(self, spider: Spider) -> None:
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.compact()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.stats:
+            self.stats.set_value("zen/outbox/pending", len(self.records))
+
+    async def run(self, spider: Spider) -> None:
+        # give sinks a moment to connect before the startup replay
+        await asyncio.sleep(min(5.0, self.interval))
+        while True:
+            try:
+                await self.replay(spider)
+            except Exception as e:
+                spider.logger.error(f"Outbox replay failed\n{str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def replay(self, spider: Spider) -> None:
+        now = time.time()
+        due = [
+            record
+            for record in self.records.values()
+            if any(state["next_at"] <= now for state in record["sinks"].values())
+        ]
+        await asyncio.gather(*[self._replay_one(record, spider) for record in due])
+        if self.garbage > max(1000, len(self.records)):
+            self.compact()
+
+    async def _replay_one(self, record: Dict, spider: Spider) -> None:
+        sinks = get_sinks(self.crawler)
+        async with self.sem:
+            now = time.time()
+            for name, state in list(record["sinks"].items()):
+                if state["next_at"] > now:
+                    continue
+                sink = sinks.get(name)
+                if sink is None:
+                    # sink no longer configured
+                    del record["sinks"][name]
+                    continue
+                breaker = getattr(sink, "breaker", None)
+                if breaker is not None and breaker.is_open:
+                    # sink is known to be down, retry next round without using an attempt
+                    continue
+                item = dict(record["item"])
+                try:
+                    await asyncio.wait_for(sink.process_item(item, spider), self.timeout)
+                except Exception as e:
+                    spider.logger.error(
+                        f"Failed to replay to {name}: {record['id']}\n{str(e)}"
+                    )
+                finally:
+                    # replayed items never reach item_scraped
+                    release_payloads(item)
+                if self.stats:
+                    self.stats.inc_value("zen/outbox/replayed")
+                if name in item.get("_delivered_to", []):
+                    del record["sinks"][name]
+                    if self.stats:
+                        self.stats.inc_value("zen/outbox/delivered")
+                    continue
+                state["attempts"] += 1
+                if state["attempts"] >= self.max_attempts:
+                    spider.logger.error(
+                        f"Giving up on {name} after {state['attempts']} replays: "
+                        f"{record['id']}"
+                    )
+                    del record["sinks"][name]
+                    if self.stats:
+                        self.stats.inc_value("zen/outbox/given_up")
+                    if not record["sinks"] and self.on_give_up:
+                        await self.on_give_up(record["id"], spider)
+                    continue
+                delay = min(self.backoff_max, self.backoff_base * 2 ** state["attempts"])
+                state["next_at"] = now + delay / 2 + random.uniform(0, delay / 2)
+        if record["sinks"]:
+            self._write(record)
+        else:
+            self._write({"id": record["id"], "done": True})
+        if self.stats:
+            self.stats.set_value("zen/outbox/pending", len(self.records))
+
+    def compact(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if not self.records:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.garbage = 0
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            for record in self.records.values():
+                f.write(json.dumps(record, default=str) + "\n")
+        os.replace(tmp, self.path)
+        self.garbage = 0
+
+    def _write(self, record: Dict) -> None:
+        if record.get("done"):
+            if self.records.pop(record["id"], None) is None:
+                return
+        else:
+            if record["id"] in self.records:
+                self.garbage += 1
+            self.records[record["id"]] = record
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+
+
+_outboxes: "WeakKeyDictionary[Crawler, Outbox]" = WeakKeyDictionary()
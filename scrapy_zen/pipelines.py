@@ -1,28 +1,51 @@
 import asyncio
-from collections import defaultdict
+from collections import defaultdict, deque
 import importlib
-import json
-from typing import Dict, List, Self
+import os
+import random
+from typing import Awaitable, Callable, Dict, List, Self, Tuple
 import grpc
-import scrapy
 from scrapy.crawler import Crawler
 from scrapy.settings import Settings
 from scrapy.spiders import Spider
 from scrapy.exceptions import DropItem, NotConfigured
 from datetime import datetime, timedelta, timezone
-from scrapy.utils.defer import maybe_deferred_to_future
-from scrapy.http.request import NO_CALLBACK
-import dateparser
+from scrapy.utils.misc import build_from_crawler, load_object
+from scrapy.statscollectors import StatsCollector
 from scrapy import Item, signals
 import websockets
 import logging
 
 logging.getLogger("websockets").setLevel(logging.WARNING)
 logging.getLogger("pymongo").setLevel(logging.ERROR)
+logger = logging.getLogger(__name__)
 
 from spidermon.contrib.scrapy.pipelines import ItemValidationPipeline
 from scrapy_zen import normalize_url
-from scrapy_zen.databases import RedisDB
+from scrapy_zen.clients import (
+    EngineClient,
+    PooledClient,
+    SinkHTTPError,
+    SinkResponse,
+    sink_client,
+)
+from scrapy_zen.databases import DB, db_from_crawler
+from scrapy_zen.delivery import (
+    LATENCY_BUCKETS_MS,
+    DeliveryBuffer,
+    ItemBatcher,
+    batch_results,
+    dumps,
+    mark_delivered,
+    get_sinks,
+    join_payloads,
+    observe,
+    payload,
+    register_sink,
+    release_payloads,
+)
+from scrapy_zen.outbox import Outbox
+from scrapy_zen.utils import job_dir, parse_date
 
 
 
@@ -35,9 +58,11 @@ class PreProcessingPipeline(ItemValidationPipeline):
     def __init__(
         self,
         settings: Settings,
+        db: DB,
         validation_enabled: bool,
         validators=None,
         stats=None,
+        crawler_stats: StatsCollector | None = None,
     ) -> None:
         if validation_enabled:
             super().__init__(
@@ -54,19 +79,25 @@ class PreProcessingPipeline(ItemValidationPipeline):
                 ),
             )
         self.settings = settings
+        self.db = db
+        self.crawler_stats = crawler_stats
         self.validation_enabled = validation_enabled
+        self.cleanup_task: asyncio.Task | None = None
 
 
     @classmethod
     def from_crawler(cls, crawler: Crawler) -> Self:
-        for setting in RedisDB.settings:
+        db = db_from_crawler(crawler)
+        for setting in db.settings:
             if not crawler.settings.get(setting):
                 raise NotConfigured(f"{setting} is not set")
         spidermon_enabled = crawler.settings.getbool("SPIDERMON_ENABLED")
         if not spidermon_enabled:
             p = cls(
                 settings=crawler.settings,
+                db=db,
                 validation_enabled=False,
+                crawler_stats=crawler.stats,
             )
             crawler.signals.connect(p.spider_opened, signal=signals.spider_opened)
             crawler.signals.connect(p.spider_closed, signal=signals.spider_closed)
@@ -91,9 +122,11 @@ class PreProcessingPipeline(ItemValidationPipeline):
 
         p = cls(
             settings=crawler.settings,
+            db=db,
             validation_enabled=True if validators else False,
             validators=validators,
             stats=crawler.stats,
+            crawler_stats=crawler.stats,
         )
         crawler.signals.connect(p.spider_opened, signal=signals.spider_opened)
         crawler.signals.connect(p.spider_closed, signal=signals.spider_closed)
@@ -101,18 +134,29 @@ class PreProcessingPipeline(ItemValidationPipeline):
 
     async def spider_opened(self, spider: Spider) -> None:
         try:
-            self.db = RedisDB()
             await self.db.connect(*[self.settings.get(setting) for setting in self.db.settings])
         except:
             raise NotConfigured("Failed to connect to DB")
         days = self.settings.getint("DB_EXPIRY_DAYS", 15)
         if days:
             spider.logger.warning("Expiration enabled for DB records")
+            # expired records are removed in the background, items can be processed meanwhile
+            self.cleanup_task = asyncio.create_task(self.cleanup(days, spider))
+
+    async def cleanup(self, days: int, spider: Spider) -> None:
+        try:
             await self.db.cleanup(days)
+        except Exception as e:
+            spider.logger.error(f"Failed to cleanup DB records: {str(e)}")
 
     async def spider_closed(self, spider: Spider) -> None:
-        if hasattr(self, "db"):
-            await self.db.close()
+        if self.cleanup_task and not self.cleanup_task.done():
+            self.cleanup_task.cancel()
+            try:
+                await self.cleanup_task
+            except asyncio.CancelledError:
+                pass
+        await self.db.close()
 
     def is_recent(
         self, date_str: str, date_format: str, debug_info: str, spider: Spider
@@ -124,10 +168,7 @@ class PreProcessingPipeline(ItemValidationPipeline):
             if not date_str:
                 return True
             utc_today = datetime.now(timezone.utc).date()
-            input_date = dateparser.parse(
-                date_string=date_str,
-                date_formats=[date_format] if date_format is not None else None,
-            ).date()
+            input_date = parse_date(date_str, date_format, self.crawler_stats).date()
             return input_date >= (utc_today - timedelta(days=2))
         except Exception as e:
             spider.logger.error(f"{str(e)}: {debug_info} ")
@@ -153,11 +194,9 @@ class PreProcessingPipeline(ItemValidationPipeline):
         _id = item.get("_id", None)
         if _id:
             _id = normalize_url(_id)
-            id_exists = await self.db.exists(_id, spider.name)
-            if id_exists:
+            claimed = await self.db.claim(_id, spider.name)
+            if not claimed:
                 raise DropItem(f"Already exists [{_id}]")
-            else:
-                await self.db.insert(_id, spider.name)
         _dt = item.pop("_dt", None)
         _dt_format = item.pop("_dt_format", None)
         if _dt:
@@ -182,54 +221,97 @@ class PostProcessingPipeline:
 
     Attributes:
         settings (Settings): crawler settings object
+        db (DB): dedup database
+        outbox (Outbox): spool for items some sinks failed to deliver, if enabled
     """
 
-    def __init__(self, settings: Settings) -> None:
+    def __init__(self, settings: Settings, db: DB, outbox: Outbox | None = None) -> None:
         self.settings = settings
+        self.db = db
+        self.outbox = outbox
+        if outbox is not None:
+            outbox.on_give_up = self.forget
 
     @classmethod
     def from_crawler(cls, crawler: Crawler) -> Self:
-        for setting in RedisDB.settings:
+        db = db_from_crawler(crawler)
+        for setting in db.settings:
             if not crawler.settings.get(setting):
                 raise NotConfigured(f"{setting} is not set")
-        p = cls(settings=crawler.settings)
+        p = cls(settings=crawler.settings, db=db, outbox=Outbox.from_crawler(crawler))
         crawler.signals.connect(p.spider_opened, signal=signals.spider_opened)
-        crawler.signals.connect(p.spider_closed, signal=signals.spider_closed)
+        # engine_stopped fires after spider_closed, sinks can still give up ids on close
+        crawler.signals.connect(p.engine_stopped, signal=signals.engine_stopped)
         return p
 
     async def spider_opened(self, spider: Spider) -> None:
+        # sinks that accept items before sending them report the ones they give up on
+        for sink in get_sinks(spider.crawler).values():
+            if hasattr(sink, "on_give_up"):
+                sink.on_give_up = self.forget
         try:
-            self.db = RedisDB()
             await self.db.connect(*[self.settings.get(setting) for setting in self.db.settings])
         except:
             raise NotConfigured("Failed to connect to DB")
 
-    async def spider_closed(self, spider: Spider) -> None:
-        if hasattr(self, "db"):
-            await self.db.close()
+    async def engine_stopped(self) -> None:
+        await self.db.close()
 
     async def process_item(self, item: Dict, spider: Spider) -> Dict:
-        if not item.pop("_delivered", None):
+        delivered = item.pop("_delivered", None)
+        delivered_to = item.pop("_delivered_to", [])
+        release_payloads(item)
+        if self.outbox is not None and item.get("_id"):
+            failed = [s for s in get_sinks(spider.crawler) if s not in delivered_to]
+            if failed:
+                # keep the id, the outbox retries the failed sinks instead of a re-crawl
+                self.outbox.add(item, failed)
+                return item
+        if not delivered:
             _id = item.get("_id", None)
             if _id:
-                _id = normalize_url(_id)
-                await self.db.remove(_id, spider.name)
+                await self.forget(_id, spider)
         return item
 
+    async def forget(self, _id: str, spider: Spider) -> None:
+        await self.db.remove(normalize_url(_id), spider.name)
+
 
 class DiscordPipeline:
     """
-    Pipeline to send items to a Discord webhook.
+    Pipeline to send items to a Discord webhook. Items are queued and sent by a single
+    worker that follows the webhook's rate limit headers and packs up to 10 queued
+    items into one message.
 
     Attributes:
         uri (str):
+        max_retries (int): retries for failed sends, 429s are always retried
+        drain_timeout (float): seconds to wait for queued items on close
         exclude_fields (List[str]): List of fields that needs to be excluded for this pipeline
     """
 
     exclude_fields: List[str] = ["body"]
+    # Discord limits per message and per embed description
+    max_embeds: int = 10
+    max_chars: int = 6000
+    max_description: int = 4096
 
-    def __init__(self, uri: str) -> None:
+    def __init__(
+        self,
+        uri: str,
+        client: PooledClient | EngineClient | None = None,
+        max_retries: int = 5,
+        drain_timeout: float = 60.0,
+        stats: StatsCollector | None = None,
+    ) -> None:
         self.uri = uri
+        self.client = client
+        self.max_retries = max_retries
+        self.drain_timeout = drain_timeout
+        self.stats = stats
+        self.queue: asyncio.Queue | None = None
+        self.worker: asyncio.Task | None = None
+        self.blocked_until = 0.0
 
     @classmethod
     def from_crawler(cls, crawler: Crawler) -> Self:
@@ -237,44 +319,169 @@ class DiscordPipeline:
         for setting in settings:
             if not crawler.settings.get(setting):
                 raise NotConfigured(f"{setting} is not set")
-        return cls(uri=crawler.settings.get("DISCORD_SERVER_URI"))
+        p = cls(
+            uri=crawler.settings.get("DISCORD_SERVER_URI"),
+            client=sink_client(crawler),
+            max_retries=crawler.settings.getint("DISCORD_MAX_RETRIES", 5),
+            drain_timeout=crawler.settings.getfloat("DISCORD_DRAIN_TIMEOUT", 60.0),
+            stats=crawler.stats,
+        )
+        crawler.signals.connect(p.spider_closed, signal=signals.spider_closed)
+        register_sink(crawler, p)
+        return p
+
+    async def spider_closed(self, spider: Spider) -> None:
+        if self.worker is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            spider.logger.error(
+                f"Discord queue not drained after {self.drain_timeout}s, "
+                f"dropping {self.queue.qsize()} items"
+            )
+        self.worker.cancel()
+        while not self.queue.empty():
+            _, _, future = self.queue.get_nowait()
+            if not future.done():
+                future.set_result(False)
 
     async def process_item(self, item: Dict, spider: Spider) -> Dict:
         await self._send(item, spider)
         return item
 
     async def _send(self, item: Dict, spider: Spider) -> None:
+        if self.worker is None:
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.create_task(self._run(spider))
+        description = payload(item, self.exclude_fields).decode()
+        if len(description) > self.max_description:
+            # Discord rejects the whole message otherwise
+            description = description[: self.max_description - 3] + "..."
+            if self.stats:
+                self.stats.inc_value("zen/discord/truncated")
+        embed = {
+            "title": "Alert",
+            "description": description,
+            "color": int("03b2f8", 16),
+        }
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, embed, future))
+        if await future:
+            mark_delivered(item, self)
+
+    async def _run(self, spider: Spider) -> None:
+        carry = None
+        while True:
+            batch = [carry or await self.queue.get()]
+            carry = None
+            size = len(batch[0][1]["title"]) + len(batch[0][1]["description"])
+            while len(batch) < self.max_embeds and not self.queue.empty():
+                entry = self.queue.get_nowait()
+                entry_size = len(entry[1]["title"]) + len(entry[1]["description"])
+                if size + entry_size > self.max_chars:
+                    carry = entry
+                    break
+                batch.append(entry)
+                size += entry_size
+            try:
+                await self._deliver_batch(batch, spider)
+            except Exception as e:
+                for item, _, _ in batch:
+                    spider.logger.error(
+                        f"Failed to send to Discord: {item.get('_id')}\n{str(e)}"
+                    )
+            finally:
+                # resolve every entry, also when cancelled, so no process_item hangs
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_result(False)
+                    self.queue.task_done()
+
+    async def _deliver_batch(
+        self, batch: List[Tuple[Dict, Dict, asyncio.Future]], spider: Spider
+    ) -> None:
         try:
-            _item = {
-                k: v
-                for k, v in item.items()
-                if not k.startswith("_") and k.lower() not in self.exclude_fields
-            }
-            await maybe_deferred_to_future(
-                spider.crawler.engine.download(
-                    scrapy.Request(
-                        url=self.uri,
-                        method="POST",
-                        body=json.dumps(
-                            {
-                                "embeds": [
-                                    {
-                                        "title": "Alert",
-                                        "description": json.dumps(_item),
-                                        "color": int("03b2f8", 16),
-                                    }
-                                ]
-                            }
-                        ),
-                        headers={"Content-Type": "application/json"},
-                        callback=NO_CALLBACK,
-                        errback=lambda f: spider.logger.error((f.value)),
-                    ),
+            await self._deliver(batch, spider)
+        except SinkHTTPError as e:
+            if len(batch) == 1 or not 400 <= (e.status or 0) < 500:
+                raise
+            # one rejected embed fails the whole message, send them one by one instead
+            if self.stats:
+                self.stats.inc_value("zen/discord/unpacked")
+            for entry in batch:
+                try:
+                    await self._deliver([entry], spider)
+                except Exception as e:
+                    spider.logger.error(
+                        f"Failed to send to Discord: {entry[0].get('_id')}\n{str(e)}"
+                    )
+                    if not entry[2].done():
+                        entry[2].set_result(False)
+
+    async def _deliver(
+        self, batch: List[Tuple[Dict, Dict, asyncio.Future]], spider: Spider
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        body = dumps({"embeds": [embed for _, embed, _ in batch]})
+        attempt = 0
+        while True:
+            delay = self.blocked_until - loop.time()
+            if delay > 0:
+                if self.stats:
+                    self.stats.inc_value("zen/discord/throttled")
+                await asyncio.sleep(delay)
+            try:
+                response = await self.client.post(
+                    url=self.uri,
+                    body=body,
+                    headers={"Content-Type": "application/json"},
                 )
+            except Exception as e:
+                # transport errors are retried
+                error = e
+            else:
+                self._update_limits(response)
+                if response.ok:
+                    break
+                if response.status == 429:
+                    if self.stats:
+                        self.stats.inc_value("zen/discord/rate_limited")
+                    continue
+                if response.status < 500:
+                    # rejected, sending it again won't help
+                    response.raise_for_status()
+                error = SinkHTTPError(
+                    f"HTTP {response.status}: {response.body[:200]!r}", response.status
+                )
+            attempt += 1
+            if attempt > self.max_retries:
+                raise error
+            spider.logger.warning(
+                f"Retrying Discord send ({attempt}/{self.max_retries}): {str(error)}"
             )
-            item["_delivered"] = True
-        except Exception as e:
-            spider.logger.error(f"Failed to send to Discord: {item['_id']}\n{str(e)}")
+            await asyncio.sleep(min(2**attempt, 30))
+
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result(True)
+        if self.stats:
+            self.stats.inc_value("zen/discord/messages")
+            self.stats.inc_value("zen/discord/embeds", len(batch))
+
+    def _update_limits(self, response: SinkResponse) -> None:
+        headers = response.headers
+        now = asyncio.get_running_loop().time()
+        if response.status == 429:
+            retry_after = headers.get("retry-after")
+            if retry_after is None:
+                try:
+                    retry_after = response.json().get("retry_after")
+                except Exception:
+                    pass
+            self.blocked_until = now + float(retry_after or 1.0)
+        elif headers.get("x-ratelimit-remaining") == "0":
+            self.blocked_until = now + float(headers.get("x-ratelimit-reset-after", 1.0))
 
 
 class SynopticPipeline:
@@ -289,10 +496,25 @@ class SynopticPipeline:
 
     exclude_fields: List[str] = []
 
-    def __init__(self, uri: str, stream_id: str, api_key: str) -> None:
+    def __init__(
+        self,
+        uri: str,
+        stream_id: str,
+        api_key: str,
+        batch_size: int = 0,
+        batch_interval: float = 1.0,
+        stats: StatsCollector | None = None,
+        client: PooledClient | EngineClient | None = None,
+    ) -> None:
         self.uri = uri
         self.stream_id = stream_id
         self.api_key = api_key
+        self.client = client
+        self.batcher = None
+        if batch_size > 1:
+            self.batcher = ItemBatcher(
+                "synoptic", self._send_batch, batch_size, batch_interval, stats
+            )
 
     @classmethod
     def from_crawler(cls, crawler: Crawler) -> Self:
@@ -300,39 +522,59 @@ class SynopticPipeline:
         for setting in settings:
             if not crawler.settings.get(setting):
                 raise NotConfigured(f"{setting} is not set")
-        return cls(
+        p = cls(
             uri=crawler.settings.get("SYNOPTIC_SERVER_URI"),
             stream_id=crawler.settings.get("SYNOPTIC_STREAM_ID"),
             api_key=crawler.settings.get("SYNOPTIC_API_KEY"),
+            batch_size=crawler.settings.getint("SYNOPTIC_BATCH_SIZE", 0),
+            batch_interval=crawler.settings.getint("SYNOPTIC_BATCH_INTERVAL_MS", 1000)
+            / 1000,
+            stats=crawler.stats,
+            client=sink_client(crawler),
         )
+        if p.batcher:
+            crawler.signals.connect(p.spider_closed, signal=signals.spider_closed)
+        register_sink(crawler, p)
+        return p
+
+    async def spider_closed(self, spider: Spider) -> None:
+        await self.batcher.close()
 
     async def process_item(self, item: Dict, spider: Spider) -> Dict:
-        await self._send(item, spider)
+        if self.batcher:
+            if await self.batcher.add(item, spider):
+                mark_delivered(item, self)
+            else:
+                spider.logger.error(f"Failed to send to Synoptic: {item['_id']}")
+        else:
+            await self._send(item, spider)
         return item
 
+    async def _send_batch(self, items: List[Dict], spider: Spider) -> List[bool]:
+        _items = [payload(item, self.exclude_fields) for item in items]
+        response = await self.client.post(
+            url=self.uri,
+            body=join_payloads(_items),
+            headers={
+                "content-type": "application/json",
+                "x-api-key": self.api_key,
+            },
+        )
+        return batch_results(response, len(items))
+
     async def _send(self, item: Dict, spider: Spider) -> None:
         try:
-            _item = {
-                k: v
-                for k, v in item.items()
-                if not k.startswith("_") and k.lower() not in self.exclude_fields
-            }
-            await maybe_deferred_to_future(
-                spider.crawler.engine.download(
-                    scrapy.Request(
-                        url=self.uri,
-                        body=json.dumps(_item),
-                        method="POST",
-                        headers={
-                            "content-type": "application/json",
-                            "x-api-key": self.api_key,
-                        },
-                        callback=NO_CALLBACK,
-                        errback=lambda f: spider.logger.error((f.value)),
-                    )
-                )
+            _item = payload(item, self.exclude_fields)
+            response = await self.client.post(
+                url=self.uri,
+                body=_item,
+                headers={
+                    "content-type": "application/json",
+                    "x-api-key": self.api_key,
+                },
             )
-            item["_delivered"] = True
+            response.raise_for_status()
+            mark_delivered(item, self)
         except Exception as e:
             spider.logger.error(f"Failed to send to Synoptic: {item['_id']}\n{str(e)}")
 
@@ -350,10 +592,17 @@ class TelegramPipeline:
 
     exclude_fields: List[str] = []
 
-    def __init__(self, uri: str, token: str, chat_id: str) -> None:
+    def __init__(
+        self,
+        uri: str,
+        token: str,
+        chat_id: str,
+        client: PooledClient | EngineClient | None = None,
+    ) -> None:
         self.uri = uri
         self.token = token
         self.chat_id = chat_id
+        self.client = client
 
     @classmethod
     def from_crawler(cls, crawler: Crawler) -> Self:
@@ -361,11 +610,14 @@ class TelegramPipeline:
         for setting in settings:
             if not crawler.settings.get(setting):
                 raise NotConfigured(f"{setting} is not set")
-        return cls(
+        p = cls(
             uri=crawler.settings.get("TELEGRAM_SERVER_URI"),
             token=crawler.settings.get("TELEGRAM_TOKEN"),
             chat_id=crawler.settings.get("TELEGRAM_CHAT_ID"),
+            client=sink_client(crawler),
         )
+        register_sink(crawler, p)
+        return p
 
     async def process_item(self, item: Dict, spider: Spider) -> Dict:
         await self._send(item, spider)
@@ -373,27 +625,17 @@ class TelegramPipeline:
 
     async def _send(self, item: Dict, spider: Spider) -> None:
         try:
-            _item = {
-                k: v
-                for k, v in item.items()
-                if not k.startswith("_") and k.lower() not in self.exclude_fields
-            }
-            await maybe_deferred_to_future(
-                spider.crawler.engine.download(
-                    scrapy.Request(
-                        url=self.uri,
-                        body=json.dumps(_item),
-                        method="POST",
-                        headers={
-                            "content-type": "application/json",
-                            "authorization": self.token,
-                        },
-                        callback=NO_CALLBACK,
-                        errback=lambda f: spider.logger.error((f.value)),
-                    )
-                )
+            _item = payload(item, self.exclude_fields)
+            response = await self.client.post(
+                url=self.uri,
+                body=_item,
+                headers={
+                    "content-type": "application/json",
+                    "authorization": self.token,
+                },
             )
-            item["_delivered"] = True
+            response.raise_for_status()
+            mark_delivered(item, self)
         except Exception as e:
             spider.logger.error(f"Failed to send to Telegram: {item['_id']}\n{str(e)}")
 
@@ -407,6 +649,14 @@ class GRPCPipeline:
         token (str):
         id (str):
         proto_module (str): dotted path to gRPC contract module
+        stream_method (str): optional client- or bidi-streaming method of IngressService,
+            falls back to unary `SubmitFeedMessage` when the proto doesn't have it
+        max_in_flight (int): max messages sent but not acknowledged yet
+        buffer_size (int): messages buffered while disconnected, 0 blocks items instead
+        spill_path (str): file the buffer overflows to, None to block when it is full
+        max_retries (int): failed sends of a buffered message before it is given up
+        on_give_up (Callable): coroutine called with (id, spider) for buffered messages
+            that are given up or lost at close, their items were marked delivered
         exclude_fields (List[str]): List of fields that needs to be excluded for this pipeline
     """
     exclude_fields: List[str] = []
@@ -414,6 +664,17 @@ class GRPCPipeline:
 
     def __init__(
         self, uri: str, token: str, id: str, id_headline: str, proto_module: str,
+        stats: StatsCollector | None = None,
+        stream_method: str | None = None,
+        max_in_flight: int = 16,
+        ack_timeout: float = 30.0,
+        secure: bool = True,
+        buffer_size: int = 0,
+        spill_path: str | None = None,
+        max_retries: int = 5,
+        drain_timeout: float = 30.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
     ) -> None:
         self.uri = uri
         self.token = token
@@ -425,7 +686,41 @@ class GRPCPipeline:
         self.client_grpc = None
         self.connected = asyncio.Event()
         self.t: asyncio.Task = None
-        self.sem = asyncio.Semaphore(16)
+        self.sem = asyncio.Semaphore(max_in_flight)
+        self.stats = stats
+        self.stream_method = stream_method
+        self.stream_kind: str | None = None
+        self.stream: grpc.aio.StreamStreamCall | None = None
+        self.ack_reader: asyncio.Task | None = None
+        self.stream_lock = asyncio.Lock()
+        self.acks: Dict[str, asyncio.Future] = {}
+        self.ack_timeout = ack_timeout
+        self.secure = secure
+        # client-streaming: one call per window of messages, acked when the call completes
+        self.batcher = None
+        if stream_method:
+            self.batcher = ItemBatcher(
+                "grpc", self._send_stream_batch, max_in_flight, 0.05, stats
+            )
+        self.buffer = None
+        if buffer_size > 0:
+            self.buffer = DeliveryBuffer(
+                "grpc",
+                buffer_size,
+                spill_path,
+                serialize=lambda m: m.SerializeToString(),
+                deserialize=self.feed_pb2.FeedMessage.FromString,
+                stats=stats,
+            )
+        self.drainer: asyncio.Task = None
+        self.drains: set[asyncio.Task] = set()
+        self.max_retries = max_retries
+        self.attempts: Dict[str, int] = {}
+        self.on_give_up: Callable[[str, Spider], Awaitable[None]] | None = None
+        self.drain_timeout = drain_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.outage_started: float | None = None
 
 
     @classmethod
@@ -440,13 +735,37 @@ class GRPCPipeline:
             id=crawler.settings.get("GRPC_ID"),
             id_headline=crawler.settings.get("GRPC_ID_HEADLINE"),
             proto_module=crawler.settings.get("GRPC_PROTO_MODULE"),
+            stats=crawler.stats,
+            stream_method=crawler.settings.get("GRPC_STREAM_METHOD"),
+            max_in_flight=crawler.settings.getint("GRPC_MAX_IN_FLIGHT", 16),
+            ack_timeout=crawler.settings.getfloat("GRPC_ACK_TIMEOUT", 30.0),
+            secure=crawler.settings.getbool("GRPC_SECURE", True),
+            buffer_size=crawler.settings.getint("GRPC_BUFFER_SIZE", 10_000),
+            spill_path=cls.spill_path(crawler),
+            max_retries=crawler.settings.getint("GRPC_MAX_RETRIES", 5),
+            drain_timeout=crawler.settings.getfloat("GRPC_DRAIN_TIMEOUT", 30.0),
+            backoff_base=crawler.settings.getfloat("GRPC_BACKOFF_BASE", 0.5),
+            backoff_max=crawler.settings.getfloat("GRPC_BACKOFF_MAX", 30.0),
         )
         crawler.signals.connect(p.spider_opened, signal=signals.spider_opened)
         crawler.signals.connect(p.spider_closed, signal=signals.spider_closed)
+        register_sink(crawler, p)
         return p
 
 
+    @staticmethod
+    def spill_path(crawler: Crawler) -> str | None:
+        if not crawler.settings.getbool("GRPC_BUFFER_SPILL"):
+            return None
+        path = job_dir(crawler.settings)
+        if not path:
+            logger.warning("GRPC_BUFFER_SPILL needs ZEN_JOBDIR, buffering in memory only")
+            return None
+        return os.path.join(path, f"grpc-buffer-{crawler.spidercls.name}.bin")
+
+
     async def close_connection(self) -> None:
+        await self.close_stream()
         if self.channel_grpc:
             await self.channel_grpc.close()
         self.channel_grpc = None
@@ -454,12 +773,64 @@ class GRPCPipeline:
         self.connected.clear()
 
 
+    async def close_stream(self) -> None:
+        if self.stream is not None:
+            self.stream.cancel()
+        self.stream = None
+        reader, self.ack_reader = self.ack_reader, None
+        # the reader closes the connection itself when the server goes away
+        if reader is not None and reader is not asyncio.current_task():
+            reader.cancel()
+            try:
+                await reader
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+
+
     async def spider_opened(self, spider: Spider) -> None:
         self.connected.clear()
         self.t = asyncio.create_task(self.connect(spider))
+        if self.buffer is not None:
+            if len(self.buffer):
+                spider.logger.info(f"Replaying {len(self.buffer)} buffered gRPC messages")
+            self.drainer = asyncio.create_task(self.drain(spider))
 
 
     async def spider_closed(self, spider: Spider) -> None:
+        if self.buffer is not None:
+            try:
+                await asyncio.wait_for(self.buffer.join(), self.drain_timeout)
+                if self.drains:
+                    await asyncio.wait(self.drains, timeout=self.ack_timeout)
+            except asyncio.TimeoutError:
+                pass
+            if self.drainer:
+                self.drainer.cancel()
+            for t in self.drains:
+                t.cancel()
+            await asyncio.gather(self.drainer, *self.drains, return_exceptions=True)
+            lost = self.buffer.close()
+            if lost:
+                spider.logger.error(
+                    f"{len(lost)} buffered messages were not sent to gRPC server"
+                )
+                if self.stats:
+                    self.stats.set_value("zen/grpc/buffer/lost", len(lost))
+                if self.on_give_up:
+                    for feed_message in lost:
+                        await self.on_give_up(feed_message.messageId, spider)
+            elif len(self.buffer):
+                spider.logger.warning(
+                    f"{len(self.buffer)} buffered gRPC messages kept for the next run"
+                )
+        if self.batcher:
+            await self.batcher.close()
+        if self.stream is not None:
+            try:
+                await self.stream.done_writing()
+            except Exception:
+                pass
         if self.t and not self.t.done():
             self.t.cancel()
             try:
@@ -470,61 +841,303 @@ class GRPCPipeline:
 
 
     async def connect(self, spider: Spider) -> None:
+        attempt = 0
         while True:
-            if self.connected.is_set():
-                await asyncio.sleep(2.0)
-                continue
             spider.logger.debug("connecting to gRPC server")
             try:
-                self.channel_grpc = grpc.aio.secure_channel(self.uri, grpc.ssl_channel_credentials())
+                if self.secure:
+                    self.channel_grpc = grpc.aio.secure_channel(self.uri, grpc.ssl_channel_credentials())
+                else:
+                    self.channel_grpc = grpc.aio.insecure_channel(self.uri)
                 self.client_grpc = self.feed_pb2_grpc.IngressServiceStub(self.channel_grpc)
                 await asyncio.wait_for(self.channel_grpc.channel_ready(), timeout=10.0)
             except (Exception, asyncio.TimeoutError) as e:
                 spider.logger.error(e)
                 await self.close_connection()
+                attempt += 1
+                if self.stats:
+                    self.stats.inc_value("zen/grpc/connect_failures")
+                await asyncio.sleep(self.backoff(attempt))
                 continue
-            else:
-                spider.logger.debug("connected to gRPC server")
-                self.connected.set()
+            spider.logger.debug("connected to gRPC server")
+            attempt = 0
+            self.stream_kind = self.get_stream_kind(spider)
+            self.connected.set()
+            self.record_reconnect()
+            await self.watch(self.channel_grpc)
+            spider.logger.warning("lost connection to gRPC server")
+            self.outage_started = asyncio.get_running_loop().time()
+            await self.close_connection()
+
+
+    def backoff(self, attempt: int) -> float:
+        # exponential backoff with equal jitter
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+    async def watch(self, channel: grpc.aio.Channel) -> None:
+        try:
+            state = channel.get_state()
+            while state not in (
+                grpc.ChannelConnectivity.TRANSIENT_FAILURE,
+                grpc.ChannelConnectivity.SHUTDOWN,
+            ):
+                await channel.wait_for_state_change(state)
+                state = channel.get_state()
+        except Exception:
+            pass
+
+
+    def record_reconnect(self) -> None:
+        if self.outage_started is None or not self.stats:
+            return
+        outage_ms = int((asyncio.get_running_loop().time() - self.outage_started) * 1000)
+        self.outage_started = None
+        self.stats.inc_value("zen/grpc/reconnects")
+        self.stats.inc_value("zen/grpc/outage_ms", outage_ms)
+        self.stats.max_value("zen/grpc/max_outage_ms", outage_ms)
+
+
+    def get_stream_kind(self, spider: Spider) -> str | None:
+        if not self.stream_method:
+            return None
+        method = getattr(self.client_grpc, self.stream_method, None)
+        if isinstance(method, grpc.aio.StreamStreamMultiCallable):
+            return "bidi"
+        if isinstance(method, grpc.aio.StreamUnaryMultiCallable):
+            return "client"
+        if self.stream_kind is None:
+            spider.logger.warning(
+                f"{self.stream_method} is not a streaming method of IngressService, "
+                "falling back to SubmitFeedMessage"
+            )
+        self.stream_method = None
+        return None
 
 
     async def process_item(self, item: Dict, spider: str) -> Dict:
-        async with self.sem:
-            await self._send(item, spider)
+        if self.buffer is not None:
+            await self._send_or_buffer(item, spider)
+        else:
+            async with self.sem:
+                await self._send(item, spider)
         return item
 
 
-    async def _send(self, item: Dict, spider: Spider) -> None:
-        _item = {
-            k: self.to_timestamp(v, spider) if k in ["scraped_at", "published_at"] else v
-            for k, v in item.items()
-            if not k.startswith("_") and k.lower() not in self.exclude_fields
-        }
+    def feed_message(self, item: Dict, spider: Spider) -> object:
+        _item = payload(
+            item,
+            self.exclude_fields,
+            transform=lambda k, v: (
+                self.to_timestamp(v, spider) if k in ["scraped_at", "published_at"] else v
+            ),
+            name="grpc",
+        )
         feed_id = self.id
-        if ("body" in _item) and (_item["body"] is None) and self.id_headline:
+        if (
+            "body" in item
+            and "body" not in self.exclude_fields
+            and item["body"] is None
+            and self.id_headline
+        ):
             feed_id = self.id_headline
         feed_message = self.feed_pb2.FeedMessage(
             token=self.token,
             feedId=feed_id,
             messageId=item['_id'],
-            message=json.dumps(_item),
+            message=_item.decode(),
         )
+        return feed_message
+
+
+    async def _send(self, item: Dict, spider: Spider) -> None:
+        feed_message = self.feed_message(item, spider)
         await self.connected.wait()
+        if await self._deliver(feed_message, spider):
+            mark_delivered(item, self)
+            spider.logger.debug(
+                f"Sent to gRPC server [{feed_message.feedId}]: {item['_id']}"
+            )
+
+
+    async def _send_or_buffer(self, item: Dict, spider: Spider) -> None:
+        feed_message = self.feed_message(item, spider)
+        message_id = feed_message.messageId
+        # send directly while healthy, buffer (in order) while disconnected or draining
+        if self.connected.is_set() and not len(self.buffer):
+            async with self.sem:
+                if await self._deliver(feed_message, spider):
+                    mark_delivered(item, self)
+                    spider.logger.debug(
+                        f"Sent to gRPC server [{feed_message.feedId}]: {item['_id']}"
+                    )
+                    return
+            self.attempts[message_id] = 1
+        await self.buffer.put(feed_message)
+        # accepted for delivery, messages given up or lost at close go to on_give_up
+        mark_delivered(item, self)
+        if self.stats:
+            self.stats.inc_value("zen/grpc/buffer/buffered")
+        spider.logger.debug(f"Buffered for gRPC server: {item['_id']}")
+
+
+    async def drain(self, spider: Spider) -> None:
+        while True:
+            await self.connected.wait()
+            feed_message = await self.buffer.get()
+            await self.sem.acquire()
+            t = asyncio.create_task(self._drain_one(feed_message, spider))
+            self.drains.add(t)
+            t.add_done_callback(self.drains.discard)
+
+
+    async def _drain_one(self, feed_message: object, spider: Spider) -> None:
+        message_id = feed_message.messageId
+        settled = False
+        try:
+            if not self.connected.is_set():
+                await asyncio.sleep(1.0)
+                return
+            if await self._deliver(feed_message, spider):
+                settled = True
+                self.attempts.pop(message_id, None)
+                if self.stats:
+                    self.stats.inc_value("zen/grpc/buffer/drained")
+                return
+            attempts = self.attempts.get(message_id, 0) + 1
+            if attempts >= self.max_retries:
+                settled = True
+                self.attempts.pop(message_id, None)
+                spider.logger.error(
+                    f"Giving up on gRPC message after {attempts} attempts: {message_id}"
+                )
+                if self.stats:
+                    self.stats.inc_value("zen/grpc/buffer/given_up")
+                if self.on_give_up:
+                    await self.on_give_up(message_id, spider)
+                return
+            self.attempts[message_id] = attempts
+            await asyncio.sleep(1.0)
+        finally:
+            if not settled:
+                self.buffer.put_back(feed_message)
+            self.sem.release()
+
+    async def _deliver(self, feed_message: object, spider: Spider) -> bool:
+        if self.client_grpc is None:
+            # connection dropped after connected.wait()
+            return False
+        if self.stream_kind == "bidi":
+            delivered = await self._send_stream(feed_message, spider)
+        elif self.stream_kind == "client":
+            delivered = await self.batcher.add(feed_message, spider)
+        else:
+            return await self._send_unary(feed_message, spider)
+        if not delivered:
+            spider.logger.error(
+                f"Failed to send to gRPC server: {feed_message.messageId}"
+            )
+        return delivered
+
+
+    async def _send_unary(self, feed_message: object, spider: Spider) -> bool:
         try:
             await self.client_grpc.SubmitFeedMessage(feed_message)
+        except asyncio.CancelledError:
+            # calls in flight are cancelled when the channel is closed under them
+            if asyncio.current_task().cancelling():
+                raise
+            return False
         except grpc.RpcError as e:
-            spider.logger.error(f"Failed to send to gRPC server: {item['_id']}\n{str(e)}")
+            spider.logger.error(
+                f"Failed to send to gRPC server: {feed_message.messageId}\n{str(e)}"
+            )
             await self.close_connection()
-        else:
-            item["_delivered"] = True
-            spider.logger.debug(f"Sent to gRPC server [{feed_id}]: {item['_id']}")
+            return False
+        return True
+
+
+    async def _send_stream(self, feed_message: object, spider: Spider) -> bool:
+        future = asyncio.get_running_loop().create_future()
+        async with self.stream_lock:
+            if self.stream is None:
+                # the reader of the previous stream may still be settling its acks
+                await self.close_stream()
+                self.stream = getattr(self.client_grpc, self.stream_method)()
+                self.acks = {}
+                self.ack_reader = asyncio.create_task(
+                    self._read_acks(self.stream, self.acks, spider)
+                )
+                if self.stats:
+                    self.stats.inc_value("zen/grpc/stream/opened")
+            self.acks[feed_message.messageId] = future
+            try:
+                await self.stream.write(feed_message)
+            except Exception as e:
+                spider.logger.error(f"gRPC stream write failed\n{str(e)}")
+                self.acks.pop(feed_message.messageId, None)
+                await self.close_stream()
+                return False
+        try:
+            return await asyncio.wait_for(future, self.ack_timeout)
+        except asyncio.TimeoutError:
+            self.acks.pop(feed_message.messageId, None)
+            if self.stats:
+                self.stats.inc_value("zen/grpc/stream/ack_timeouts")
+            return False
+
+
+    async def _read_acks(
+        self,
+        call: grpc.aio.StreamStreamCall,
+        acks: Dict[str, asyncio.Future],
+        spider: Spider,
+    ) -> None:
+        try:
+            while True:
+                ack = await call.read()
+                if ack is grpc.aio.EOF:
+                    break
+                # acks without a messageId confirm the oldest message in flight
+                message_id = getattr(ack, "messageId", None) or next(iter(acks), None)
+                future = acks.pop(message_id, None)
+                if future is not None and not future.done():
+                    future.set_result(not getattr(ack, "error", ""))
+                if self.stats:
+                    self.stats.inc_value("zen/grpc/stream/acks")
+        except asyncio.CancelledError:
+            pass
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.CANCELLED:
+                spider.logger.error(f"gRPC stream closed\n{str(e)}")
+                if e.code() == grpc.StatusCode.UNAVAILABLE:
+                    await self.close_connection()
+        finally:
+            if self.stream is call:
+                self.stream = None
+            for future in acks.values():
+                if not future.done():
+                    future.set_result(False)
+            acks.clear()
+
+
+    async def _send_stream_batch(
+        self, messages: List[object], spider: Spider
+    ) -> List[bool]:
+        call = getattr(self.client_grpc, self.stream_method)()
+        for feed_message in messages:
+            await call.write(feed_message)
+        await call.done_writing()
+        await call
+        return [True] * len(messages)
 
 
     def to_timestamp(self, dt: str, spider: Spider) -> int:
         if not dt:
             return None
         try:
-            dt = dateparser.parse(dt)
+            dt = parse_date(dt, stats=self.stats)
             return int(dt.timestamp() * 1000)
         except Exception as e:
             spider.logger.error(f"Failed to convert datetime to timestamp: {str(e)}")
@@ -532,17 +1145,48 @@ class GRPCPipeline:
 
 class WSPipeline:
     """
-    Pipeline to send items to a websocket server.
+    Pipeline to send items to a websocket server. Items are queued for a background
+    writer that sends them back to back and confirms each burst with a ping: messages
+    sent before a pong are delivered, the rest are replayed after a reconnect.
 
     Attributes:
         uri (str):
+        queue_size (int): max items waiting to be sent
+        compression (bool): negotiate permessage-deflate
+        ping_interval (float): seconds between liveness pings when idle
+        ping_timeout (float): seconds to wait for a pong before reconnecting
         exclude_fields (List[str]): List of fields that needs to be excluded for this pipeline
     """
 
     exclude_fields: List[str] = []
+    # messages sent per burst before a ping confirms them
+    burst_size: int = 100
 
-    def __init__(self, uri: str) -> None:
+    def __init__(
+        self,
+        uri: str,
+        queue_size: int = 1000,
+        compression: bool = True,
+        ping_interval: float = 20.0,
+        ping_timeout: float = 20.0,
+        drain_timeout: float = 30.0,
+        backoff_max: float = 30.0,
+        stats: StatsCollector | None = None,
+    ) -> None:
         self.uri = uri
+        self.compression = compression
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.drain_timeout = drain_timeout
+        self.backoff_max = backoff_max
+        self.stats = stats
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # sent but not confirmed by a pong yet: (seq, payload, future, enqueued_at)
+        self.unacked: deque = deque()
+        self.seq = 0
+        self.client = None
+        self.writer: asyncio.Task = None
+        self.pongs: set[asyncio.Task] = set()
 
     @classmethod
     def from_crawler(cls, crawler) -> Self:
@@ -550,34 +1194,151 @@ class WSPipeline:
         for setting in settings:
             if not crawler.settings.get(setting):
                 raise NotConfigured(f"{setting} is not set")
-        p = cls(uri=crawler.settings.get("WS_SERVER_URI"))
+        p = cls(
+            uri=crawler.settings.get("WS_SERVER_URI"),
+            queue_size=crawler.settings.getint("WS_QUEUE_SIZE", 1000),
+            compression=crawler.settings.getbool("WS_COMPRESSION", True),
+            ping_interval=crawler.settings.getfloat("WS_PING_INTERVAL", 20.0),
+            ping_timeout=crawler.settings.getfloat("WS_PING_TIMEOUT", 20.0),
+            drain_timeout=crawler.settings.getfloat("WS_DRAIN_TIMEOUT", 30.0),
+            backoff_max=crawler.settings.getfloat("WS_BACKOFF_MAX", 30.0),
+            stats=crawler.stats,
+        )
         crawler.signals.connect(p.spider_opened, signal=signals.spider_opened)
         crawler.signals.connect(p.spider_closed, signal=signals.spider_closed)
+        register_sink(crawler, p)
         return p
 
     async def spider_opened(self, spider: Spider) -> None:
-        self.client = await websockets.connect(self.uri)
+        self.writer = asyncio.create_task(self.write(spider))
 
     async def spider_closed(self, spider: Spider) -> None:
-        await self.client.close()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+        while (self.queue.qsize() or self.unacked) and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        self.writer.cancel()
+        await asyncio.gather(self.writer, *self.pongs, return_exceptions=True)
+        pending = list(self.unacked)
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for _, _, future, _ in pending:
+            if not future.done():
+                future.set_result(False)
+        if self.client is not None:
+            await self.client.close()
 
     async def process_item(self, item: Dict, spider: Spider) -> Dict:
         await self._send(item, spider)
         return item
 
     async def _send(self, item: Dict, spider: Spider) -> None:
-        _item = {
-            k: v
-            for k, v in item.items()
-            if not k.startswith("_") and k.lower() not in self.exclude_fields
-        }
-        try:
-            await self.client.send(json.dumps(_item))
-            item["_delivered"] = True
+        _item = payload(item, self.exclude_fields)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.seq += 1
+        # text frames, as before
+        await self.queue.put((self.seq, _item.decode(), future, loop.time()))
+        self.record_depth()
+        if await future:
+            mark_delivered(item, self)
             spider.logger.debug(f"Sent to WS server: {item['_id']}")
-        except Exception as e:
-            spider.logger.error(f"Failed to send to WS server: {item['_id']}\n{str(e)}")
-            self.client = await websockets.connect(self.uri)
+        else:
+            spider.logger.error(f"Failed to send to WS server: {item['_id']}")
+
+    async def write(self, spider: Spider) -> None:
+        attempt = 0
+        while True:
+            try:
+                self.client = await websockets.connect(
+                    self.uri,
+                    compression="deflate" if self.compression else None,
+                    # liveness is checked by our own pings, which also confirm messages
+                    ping_interval=None,
+                )
+            except Exception as e:
+                attempt += 1
+                delay = min(self.backoff_max, 0.5 * 2 ** (attempt - 1))
+                delay = delay / 2 + random.uniform(0, delay / 2)
+                spider.logger.error(
+                    f"Failed to connect to WS server, retrying in {delay:.1f}s\n{str(e)}"
+                )
+                await asyncio.sleep(delay)
+                continue
+            if attempt or self.unacked:
+                if self.stats:
+                    self.stats.inc_value("zen/ws/reconnects")
+            attempt = 0
+            try:
+                await self._replay()
+                await self._write_loop()
+            except Exception as e:
+                spider.logger.error(f"Lost connection to WS server\n{str(e)}")
+            for t in self.pongs:
+                t.cancel()
+            client, self.client = self.client, None
+            await client.close()
+
+    async def _replay(self) -> None:
+        if not self.unacked:
+            return
+        for _, payload, _, _ in self.unacked:
+            await self.client.send(payload)
+        if self.stats:
+            self.stats.inc_value("zen/ws/replayed", len(self.unacked))
+        await self._confirm(self.unacked[-1][0])
+
+    async def _write_loop(self) -> None:
+        while True:
+            try:
+                entry = await asyncio.wait_for(self.queue.get(), self.ping_interval)
+            except asyncio.TimeoutError:
+                # idle, check the connection is still alive
+                await self._confirm(self.unacked[-1][0] if self.unacked else 0)
+                continue
+            burst = [entry]
+            while len(burst) < self.burst_size and not self.queue.empty():
+                burst.append(self.queue.get_nowait())
+            self.record_depth()
+            # unacked before sending, whatever fails is replayed after reconnecting
+            self.unacked.extend(burst)
+            for entry in burst:
+                await self.client.send(entry[1])
+            if self.stats:
+                self.stats.inc_value("zen/ws/sent", len(burst))
+            await self._confirm(burst[-1][0])
+
+    async def _confirm(self, seq: int) -> None:
+        pong = await self.client.ping()
+        t = asyncio.create_task(self._wait_pong(pong, seq, self.client))
+        self.pongs.add(t)
+        t.add_done_callback(self.pongs.discard)
+
+    async def _wait_pong(self, pong: Awaitable, seq: int, client: object) -> None:
+        try:
+            await asyncio.wait_for(pong, self.ping_timeout)
+        except asyncio.TimeoutError:
+            if self.stats:
+                self.stats.inc_value("zen/ws/ping_timeouts")
+            # unblocks the writer with ConnectionClosed, it reconnects and replays
+            await client.close()
+            return
+        loop = asyncio.get_running_loop()
+        while self.unacked and self.unacked[0][0] <= seq:
+            _, _, future, enqueued_at = self.unacked.popleft()
+            if not future.done():
+                future.set_result(True)
+            observe(
+                self.stats,
+                "zen/ws/send_latency_ms",
+                (loop.time() - enqueued_at) * 1000,
+                LATENCY_BUCKETS_MS,
+            )
+
+    def record_depth(self) -> None:
+        if self.stats:
+            self.stats.set_value("zen/ws/queue/depth", self.queue.qsize())
+            self.stats.max_value("zen/ws/queue/max_depth", self.queue.qsize())
 
 
 class HttpPipeline:
@@ -592,9 +1353,23 @@ class HttpPipeline:
 
     exclude_fields: List[str] = []
 
-    def __init__(self, uri: str, token: str) -> None:
+    def __init__(
+        self,
+        uri: str,
+        token: str,
+        batch_size: int = 0,
+        batch_interval: float = 1.0,
+        stats: StatsCollector | None = None,
+        client: PooledClient | EngineClient | None = None,
+    ) -> None:
         self.uri = uri
         self.token = token
+        self.client = client
+        self.batcher = None
+        if batch_size > 1:
+            self.batcher = ItemBatcher(
+                "http", self._send_batch, batch_size, batch_interval, stats
+            )
 
     @classmethod
     def from_crawler(cls, crawler: Crawler) -> Self:
@@ -605,37 +1380,112 @@ class HttpPipeline:
         p = cls(
             uri=crawler.settings.get("HTTP_SERVER_URI"),
             token=crawler.settings.get("HTTP_TOKEN"),
+            batch_size=crawler.settings.getint("HTTP_BATCH_SIZE", 0),
+            batch_interval=crawler.settings.getint("HTTP_BATCH_INTERVAL_MS", 1000)
+            / 1000,
+            stats=crawler.stats,
+            client=sink_client(crawler),
         )
+        if p.batcher:
+            crawler.signals.connect(p.spider_closed, signal=signals.spider_closed)
+        register_sink(crawler, p)
         return p
 
+    async def spider_closed(self, spider: Spider) -> None:
+        await self.batcher.close()
+
     async def process_item(self, item: Dict, spider: Spider) -> Dict:
-        await self._send(item, spider)
+        if self.batcher:
+            if await self.batcher.add(item, spider):
+                mark_delivered(item, self)
+            else:
+                spider.logger.error(f"Failed to send to HttpWebhook: {item['_id']}")
+        else:
+            await self._send(item, spider)
         return item
 
+    async def _send_batch(self, items: List[Dict], spider: Spider) -> List[bool]:
+        _items = [payload(item, self.exclude_fields) for item in items]
+        response = await self.client.post(
+            url=self.uri,
+            body=join_payloads(_items),
+            headers={
+                "content-type": "application/json",
+                "authorization": self.token,
+            },
+        )
+        return batch_results(response, len(items))
+
     async def _send(self, item: Dict, spider: Spider) -> None:
         try:
-            _item = {
-                k: v
-                for k, v in item.items()
-                if not k.startswith("_") and k.lower() not in self.exclude_fields
-            }
-            await maybe_deferred_to_future(
-                spider.crawler.engine.download(
-                    scrapy.Request(
-                        url=self.uri,
-                        body=json.dumps(_item),
-                        method="POST",
-                        headers={
-                            "content-type": "application/json",
-                            "authorization": self.token,
-                        },
-                        callback=NO_CALLBACK,
-                        errback=lambda f: spider.logger.error((f.value)),
-                    )
-                )
+            _item = payload(item, self.exclude_fields)
+            response = await self.client.post(
+                url=self.uri,
+                body=_item,
+                headers={
+                    "content-type": "application/json",
+                    "authorization": self.token,
+                },
             )
-            item["_delivered"] = True
+            response.raise_for_status()
+            mark_delivered(item, self)
         except Exception as e:
             spider.logger.error(
                 f"Failed to send to HttpWebhook: {item['_id']}\n{str(e)}"
             )
+
+
+class FanOutPipeline:
+    """
+    Pipeline to send items to several sinks concurrently, so delivery latency is the
+    slowest sink instead of the sum of all of them. Sinks mark `_delivered` as usual.
+
+    Attributes:
+        sinks (List[Tuple[object, float]]): sink pipelines with their timeout in seconds
+    """
+
+    def __init__(self, sinks: List[Tuple[object, float]]) -> None:
+        self.sinks = sinks
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> Self:
+        paths = crawler.settings.get("ZEN_FANOUT_SINKS")
+        if not paths:
+            raise NotConfigured("ZEN_FANOUT_SINKS is not set")
+        timeout = crawler.settings.getfloat("ZEN_FANOUT_TIMEOUT", 30.0)
+        if isinstance(paths, dict):
+            # per-sink timeouts: {"scrapy_zen.pipelines.HttpPipeline": 5.0}
+            paths = {path: t or timeout for path, t in paths.items()}
+        else:
+            paths = {
+                path: timeout for path in crawler.settings.getlist("ZEN_FANOUT_SINKS")
+            }
+        sinks = []
+        for path, t in paths.items():
+            try:
+                sinks.append((build_from_crawler(load_object(path), crawler), t))
+            except NotConfigured as e:
+                logger.warning(f"{path} is disabled: {str(e)}")
+        if not sinks:
+            raise NotConfigured("None of ZEN_FANOUT_SINKS is configured")
+        return cls(sinks=sinks)
+
+    async def process_item(self, item: Dict, spider: Spider) -> Dict:
+        await asyncio.gather(
+            *[self._send(sink, timeout, item, spider) for sink, timeout in self.sinks]
+        )
+        return item
+
+    async def _send(
+        self, sink: object, timeout: float, item: Dict, spider: Spider
+    ) -> None:
+        try:
+            await asyncio.wait_for(sink.process_item(item, spider), timeout)
+        except asyncio.TimeoutError:
+            spider.logger.error(
+                f"Timed out sending to {type(sink).__name__}: {item.get('_id')}"
+            )
+        except Exception as e:
+            spider.logger.error(
+                f"Failed to send to {type(sink).__name__}: {item.get('_id')}\n{str(e)}"
+            )
@@ -1,5 +1,12 @@
+from collections import OrderedDict
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Tuple
+import time
 from scrapy.settings import BaseSettings
+from scrapy.statscollectors import StatsCollector
 from pathlib import Path
+import dateparser
 
 
 def job_dir(settings: BaseSettings) -> str | None:
@@ -9,3 +16,75 @@ def job_dir(settings: BaseSettings) -> str | None:
     if not Path(path).exists():
         Path(path).mkdir(parents=True)
     return path
+
+
+class DateParser:
+    """
+    Memoized date parsing with fast paths for explicit formats, ISO-8601 and RFC-2822,
+    dateparser is only used for free-form text. Results are cached by (string, format),
+    the ones coming from dateparser only for `relative_ttl` seconds since strings
+    like "2 hours ago" depend on the current time.
+    """
+
+    def __init__(self, max_size: int = 4096, relative_ttl: float = 300.0) -> None:
+        self.max_size = max_size
+        self.relative_ttl = relative_ttl
+        self._cache: OrderedDict[Tuple[str, str | None], Tuple[datetime | None, float | None]] = OrderedDict()
+
+    def parse(
+        self,
+        date_str: str,
+        date_format: str | None = None,
+        stats: StatsCollector | None = None,
+    ) -> datetime | None:
+        key = (date_str, date_format)
+        cached = self._cache.get(key)
+        if cached is not None:
+            value, expires_at = cached
+            if expires_at is None or expires_at > time.monotonic():
+                self._cache.move_to_end(key)
+                if stats:
+                    stats.inc_value("zen/dates/cache_hit")
+                return value
+        value, path = self._parse(date_str, date_format)
+        if stats:
+            stats.inc_value(f"zen/dates/{path}")
+        expires_at = time.monotonic() + self.relative_ttl if path == "dateparser" else None
+        self._cache[key] = (value, expires_at)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return value
+
+    @staticmethod
+    def _parse(date_str: str, date_format: str | None) -> Tuple[datetime | None, str]:
+        if date_format:
+            try:
+                return datetime.strptime(date_str, date_format), "format"
+            except ValueError:
+                pass
+        else:
+            value = date_str.strip()
+            if len(value) >= 10 and value[:4].isdigit() and value[4] == "-":
+                try:
+                    return datetime.fromisoformat(value), "iso"
+                except ValueError:
+                    pass
+            try:
+                return parsedate_to_datetime(value), "rfc2822"
+            except (TypeError, ValueError, IndexError):
+                pass
+        value = dateparser.parse(
+            date_string=date_str,
+            date_formats=[date_format] if date_format is not None else None,
+        )
+        return value, "dateparser" if value else "failed"
+
+
+date_parser = DateParser()
+
+
+def parse_date(
+    date_str: str, date_format: str | None = None, stats: StatsCollector | None = None
+) -> datetime | None:
+    return date_parser.parse(date_str, date_format, stats)